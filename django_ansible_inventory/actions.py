@@ -1,38 +1,29 @@
 from django.contrib import messages
-from django.contrib.contenttypes.models import ContentType
 from django.contrib import admin
 
-from .management.commands.populate_ips import Command
+from .jobs import enqueue
 
 
 @admin.action(description="Populate IP addresses")
 def populate_ips(modeladmin, request, queryset):
-    command = Command()
     for network_label in queryset:
-        command.handle(network_name=network_label.name)
-    modeladmin.message_user(request, "IP addresses populated successfully.")
+        enqueue("populate_ips", network_name=network_label.name)
+    modeladmin.message_user(
+        request,
+        "IP address population queued. Track progress under Jobs.",
+    )
 
 
 @admin.action(description="Mark selected as DEFAULT")
 def mark_default(modeladmin, request, queryset):
-    ct = ContentType.objects.get_for_model(queryset.model)
-    obj_model = ct.model_class()
-    model_default = obj_model.objects.get(item_default=True)
-    if queryset.count() == 1:
-        for obj in queryset:
-            if obj.admin_only is True:
-                obj.item_default = False
-                messages.error(
-                    request, "Item can not be set as default if 'Admin only' is set."
-                )
-            else:
-                obj.item_default = True
-                obj.save()
-                model_default.item_default = False
-                model_default.save()
-                messages.success(request, "Successfully marked as Default.")
-    else:
+    if queryset.count() != 1:
         messages.error(request, "Only one item can be set as Default.")
+        return
+    # save() clears the previous default in the same transaction
+    obj = queryset.get()
+    obj.item_default = True
+    obj.save()
+    messages.success(request, "Successfully marked as Default.")
 
 
 @admin.action(description="Mark selected ENABLED")
@@ -1,7 +1,9 @@
 from django.contrib import admin
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.utils import timezone
+from django.utils.html import format_html_join
+from django.utils.safestring import mark_safe
+from netaddr import AddrFormatError
 
 from .models import (
     Host,
@@ -17,8 +19,12 @@ from .models import (
     BusinessUnit,
     SupportLevel,
     SupportGroup,
+    Job,
 )
 from .forms import HostAdminForm
+from .ipam import address_ranges, format_ranges
+from .allocation import AllocationError, release, reserve
+from .utilization import get_utilization
 from .actions import (
     populate_ips,
     mark_enabled,
@@ -118,33 +124,13 @@ class HostAdmin(admin.ModelAdmin):
             ip_id = request.POST.get("ip_id")
             user = request.user
 
+            # Reserved with a conditional update so two users can not
+            # reserve the same IP at once
             try:
-                ip = NetworkAddress.objects.get(pk=ip_id)
-
-                # Check if the IP is already assigned or reserved by someone else
-                if ip.is_assigned:
-                    return JsonResponse(
-                        {"success": False, "message": "IP is already assigned."}
-                    )
-                if (
-                    ip.is_reserved
-                    and ip.reserved_by != user
-                    and not ip.is_reservation_expired()
-                ):
-                    return JsonResponse(
-                        {"success": False, "message": "IP is reserved by another user."}
-                    )
-
-                # Reserve the IP
-                ip.is_reserved = True
-                ip.reserved_by = user
-                ip.reservation_timestamp = timezone.now()
-                ip.save()
-
-                return JsonResponse({"success": True})
-
-            except NetworkAddress.DoesNotExist:
-                return JsonResponse({"success": False, "message": "IP does not exist."})
+                reserve(ip_id, user)
+            except AllocationError as error:
+                return JsonResponse({"success": False, "message": str(error)})
+            return JsonResponse({"success": True})
         else:
             return JsonResponse(
                 {"success": False, "message": "Invalid request method."}
@@ -156,25 +142,18 @@ class HostAdmin(admin.ModelAdmin):
             ip_id = request.POST.get("ip_id")
             user = request.user if request.user.is_authenticated else None
 
-            try:
-                ip = NetworkAddress.objects.get(pk=ip_id)
-
-                # Check if the IP is reserved by the current user or if the reservation has expired
-                if ip.reserved_by == user or ip.is_reservation_expired():
-                    ip.is_reserved = False
-                    ip.reserved_by = None
-                    ip.reservation_timestamp = None
-                    ip.save()
-                    return JsonResponse({"success": True})
-                else:
-                    return JsonResponse(
-                        {
-                            "success": False,
-                            "message": "You do not have permission to release this IP.",
-                        }
-                    )
-            except NetworkAddress.DoesNotExist:
+            # Only the user holding the reservation, or anyone once it has
+            # expired, may release it
+            if release([ip_id], user):
+                return JsonResponse({"success": True})
+            if not NetworkAddress.objects.filter(pk=ip_id).exists():
                 return JsonResponse({"success": False, "message": "IP does not exist."})
+            return JsonResponse(
+                {
+                    "success": False,
+                    "message": "You do not have permission to release this IP.",
+                }
+            )
         else:
             return JsonResponse(
                 {"success": False, "message": "Invalid request method."}
@@ -194,11 +173,16 @@ class NetworkLabelAdmin(admin.ModelAdmin):
         "enabled",
         "item_default",
         "deprecated",
+        "assigned_count",
+        "reserved_count",
+        "free_count",
+        "used_percent",
     )
     list_filter = [
         "enabled",
         "deprecated",
     ]
+    readonly_fields = ["address_ranges"]
     actions = [
         populate_ips,
         mark_enabled,
@@ -207,6 +191,52 @@ class NetworkLabelAdmin(admin.ModelAdmin):
         mark_deprecated,
     ]
 
+    @admin.display(description="Address ranges")
+    def address_ranges(self, obj):
+        if not obj.pk:
+            return "-"
+        ranges = address_ranges(obj)
+        return format_html_join(
+            mark_safe("<br>"),
+            "{}: {} - {} ({})",
+            (
+                (state.capitalize(), item["start"], item["end"], item["size"])
+                for state in ("free", "reserved", "assigned")
+                for item in format_ranges(ranges[state])
+            ),
+        )
+
+    def get_changelist_instance(self, request):
+        changelist = super().get_changelist_instance(request)
+        # Counters of the whole page with one cache lookup; the template
+        # reuses the evaluated result_list
+        counts = get_utilization([obj.pk for obj in changelist.result_list])
+        for obj in changelist.result_list:
+            obj._utilization = counts[obj.pk]
+        return changelist
+
+    def utilization(self, obj):
+        # Set by get_changelist_instance() for changelist rows
+        if not hasattr(obj, "_utilization"):
+            obj._utilization = get_utilization([obj.pk])[obj.pk]
+        return obj._utilization
+
+    @admin.display(description="Assigned")
+    def assigned_count(self, obj):
+        return self.utilization(obj)["assigned"]
+
+    @admin.display(description="Reserved")
+    def reserved_count(self, obj):
+        return self.utilization(obj)["reserved"]
+
+    @admin.display(description="Free")
+    def free_count(self, obj):
+        return self.utilization(obj)["free"]
+
+    @admin.display(description="Used")
+    def used_percent(self, obj):
+        return f"{self.utilization(obj)['used_percent']}%"
+
 
 @admin.register(NetworkAddress)
 class NetworkAddressAdmin(admin.ModelAdmin):
@@ -221,6 +251,16 @@ class NetworkAddressAdmin(admin.ModelAdmin):
         "is_reserved",
     ]
     search_fields = ["ip_address"]
+    ordering = ["ip_key"]
+
+    def get_search_results(self, request, queryset, search_term):
+        # A CIDR search term is answered with a range scan on ip_key
+        if "/" in search_term:
+            try:
+                return queryset.in_network(search_term.strip()), False
+            except (AddrFormatError, ValueError):
+                pass
+        return super().get_search_results(request, queryset, search_term)
 
 
 @admin.register(HostType)
@@ -405,3 +445,40 @@ class SupportLevelAdmin(admin.ModelAdmin):
         mark_default,
         mark_deprecated,
     ]
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        "task",
+        "status",
+        "progress_display",
+        "created_at",
+        "started_at",
+        "finished_at",
+    )
+    list_filter = [
+        "status",
+        "task",
+    ]
+    readonly_fields = [
+        "task",
+        "arguments",
+        "status",
+        "progress",
+        "total",
+        "message",
+        "worker",
+        "created_at",
+        "started_at",
+        "finished_at",
+    ]
+
+    @admin.display(description="Progress")
+    def progress_display(self, obj):
+        if obj.total:
+            return f"{obj.progress} / {obj.total}"
+        return obj.progress
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,279 @@
+import secrets
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .bitmap import update_bitmap
+from .ipam import materialize_free_addresses
+from .models import NetworkAddress, RESERVATION_TIMEOUT
+from .utilization import adjust_utilization, invalidate_utilization
+
+
+class AllocationError(Exception):
+    pass
+
+
+def _claimable(user=None):
+    """
+    Filter for addresses `user` may reserve: free ones, plus ones already
+    reserved by them.
+    """
+    return NetworkAddress.objects.free(user=user)
+
+
+def _release_values():
+    return {
+        "is_reserved": False,
+        "reserved_by": None,
+        "reservation_timestamp": None,
+        "lease_token": None,
+        "last_used": timezone.now(),
+    }
+
+
+# Rounds of adding rows for more free addresses of a sparse network when
+# concurrent callers claimed the ones this call added
+SPARSE_ATTEMPTS = 8
+
+
+def allocate(network_label, count=1, user=None, contiguous=False):
+    """
+    Reserves `count` free addresses of a NetworkLabel for `user`, lowest
+    addresses first, and returns them. Either all addresses are reserved or
+    AllocationError is raised and none are. The addresses share a
+    lease_token that can be passed to release_lease().
+
+    Each address is claimed with a conditional UPDATE that only matches while
+    it is still free, so concurrent callers never get the same address. On
+    databases with SKIP LOCKED, candidate rows are also locked so concurrent
+    callers pick different rows instead of competing for the same ones.
+    """
+    if count < 1:
+        raise AllocationError("At least one address must be allocated.")
+
+    if network_label.sparse:
+        # Sparse networks only store addresses in use; add rows for the
+        # free addresses about to be handed out
+        materialize_free_addresses(network_label, count, contiguous=contiguous)
+
+    claim = {
+        "is_reserved": True,
+        "reserved_by": user,
+        "reservation_timestamp": timezone.now(),
+        "lease_token": secrets.token_hex(16),
+    }
+    candidates = (
+        NetworkAddress.objects.filter(network_label=network_label)
+        .free()
+        .order_by("ip_key")
+    )
+
+    if contiguous:
+        attempt = 1
+        while True:
+            try:
+                allocated = _allocate_contiguous(
+                    network_label, candidates, count, claim
+                )
+                break
+            except AllocationError:
+                if not network_label.sparse or attempt == SPARSE_ATTEMPTS:
+                    raise
+            # Another caller took the run added for this one; the next
+            # free run starts after it
+            materialize_free_addresses(network_label, count, contiguous=True)
+            attempt += 1
+    else:
+        allocated = _claim_free(candidates, count, claim)
+        attempt = 1
+        while (
+            network_label.sparse
+            and len(allocated) < count
+            and attempt < SPARSE_ATTEMPTS
+        ):
+            # Concurrent callers added rows for the same lowest free
+            # addresses and claimed them first. Add rows for the free
+            # addresses after every claimed one, more on each round so
+            # callers still racing spread over them
+            missing = count - len(allocated)
+            materialize_free_addresses(network_label, missing * (attempt + 1))
+            allocated += _claim_free(candidates, missing, claim)
+            attempt += 1
+        if len(allocated) < count:
+            # Hand back what was claimed so the call has no effect
+            NetworkAddress.objects.filter(
+                pk__in=allocated,
+                lease_token=claim["lease_token"],
+            ).update(**_release_values())
+            raise AllocationError(
+                f"Only {len(allocated)} free addresses in {network_label}."
+            )
+
+    adjust_utilization(network_label.pk, reserved=len(allocated))
+    return list(NetworkAddress.objects.filter(pk__in=allocated).order_by("ip_key"))
+
+
+def _claim_free(candidates, count, claim):
+    """
+    Claims up to `count` of the `candidates` and returns their primary keys,
+    fewer when there are not enough free addresses left.
+    """
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            allocated = list(
+                candidates.select_for_update(skip_locked=True).values_list(
+                    "pk", flat=True
+                )[:count]
+            )
+            NetworkAddress.objects.filter(pk__in=allocated).update(**claim)
+        return allocated
+
+    # Without row locks (SQLite) every claim is its own conditional
+    # UPDATE, so no transaction holds the database lock while reading
+    allocated = []
+    exhausted = False
+    while len(allocated) < count and not exhausted:
+        # Claimed addresses drop out of `candidates` on the next query
+        batch = list(candidates.values_list("pk", flat=True)[: count - len(allocated)])
+        exhausted = len(batch) < count - len(allocated)
+        for address_id in batch:
+            if _claimable().filter(pk=address_id).update(**claim):
+                allocated.append(address_id)
+    return allocated
+
+
+def _find_run(candidates, count):
+    """
+    Returns the primary keys of the first `count` consecutive addresses in
+    `candidates`, streaming rows in address order.
+    """
+    run = []
+    previous = None
+    for address_id, key in candidates.values_list("pk", "ip_key").iterator(
+        chunk_size=2000
+    ):
+        value = int(key, 16)
+        if previous is None or value != previous + 1:
+            run = []
+        run.append(address_id)
+        previous = value
+        if len(run) == count:
+            return run
+    return None
+
+
+def _allocate_contiguous(network_label, candidates, count, claim, attempts=3):
+    """
+    Finds a run of consecutive free addresses and claims it with a single
+    conditional UPDATE. If another caller took part of the run meanwhile the
+    update is rolled back and the search starts over.
+    """
+    for _ in range(attempts):
+        run = _find_run(candidates, count)
+        if run is None:
+            raise AllocationError(
+                f"No {count} contiguous free addresses in {network_label}."
+            )
+        try:
+            with transaction.atomic():
+                claimed = _claimable().filter(pk__in=run).update(**claim)
+                if claimed != count:
+                    raise AllocationError("Addresses were taken concurrently.")
+        except AllocationError:
+            continue
+        return run
+    raise AllocationError(
+        f"Could not reserve {count} contiguous addresses in {network_label}, "
+        "try again."
+    )
+
+
+def reserve(address_id, user=None):
+    """
+    Reserves a specific address for `user`, renewing the reservation if they
+    already hold it.
+    """
+    claim = {
+        "is_reserved": True,
+        "reserved_by": user,
+        "reservation_timestamp": timezone.now(),
+        "lease_token": None,
+    }
+    if _claimable().filter(pk=address_id).update(**claim):
+        address = NetworkAddress.objects.get(pk=address_id)
+        adjust_utilization(address.network_label_id, reserved=1)
+        return address
+    if user is not None and _claimable(user).filter(pk=address_id).update(**claim):
+        return NetworkAddress.objects.get(pk=address_id)
+
+    try:
+        address = NetworkAddress.objects.get(pk=address_id)
+    except NetworkAddress.DoesNotExist:
+        raise AllocationError("IP does not exist.")
+    if address.is_assigned:
+        raise AllocationError("IP is already assigned.")
+    raise AllocationError("IP is reserved by another user.")
+
+
+def release(address_ids, user=None):
+    """
+    Releases reservations held by `user` (or expired ones) and returns how
+    many were released.
+    """
+    released = (
+        NetworkAddress.objects.filter(pk__in=address_ids, is_assigned=False)
+        .filter(
+            Q(reserved_by=user)
+            | Q(reservation_timestamp__lt=timezone.now() - RESERVATION_TIMEOUT)
+        )
+        .update(**_release_values())
+    )
+    if released:
+        # Some of the released reservations may already have expired, so
+        # the reserved counters are recounted instead of adjusted
+        invalidate_utilization()
+    return released
+
+
+def release_lease(lease_token):
+    """
+    Releases every address still reserved under a lease and returns how
+    many were released.
+    """
+    released = NetworkAddress.objects.filter(
+        lease_token=lease_token,
+        is_assigned=False,
+    ).update(**_release_values())
+    if released:
+        invalidate_utilization()
+    return released
+
+
+def assign(address):
+    """
+    Marks an address as assigned to a host, failing if someone else assigned
+    it first.
+    """
+    assigned = NetworkAddress.objects.filter(pk=address.pk, is_assigned=False).update(
+        is_assigned=True,
+        **_release_values(),
+    )
+    if not assigned:
+        raise AllocationError(
+            f"The IP address {address} is already assigned to another host."
+        )
+    was_reserved = address.is_reserved and not address.is_reservation_expired()
+    address.is_assigned = True
+    address.is_reserved = False
+    address.reserved_by = None
+    address.reservation_timestamp = None
+    address.lease_token = None
+    # Queryset updates send no signals, keep the bitmap in sync by hand
+    update_bitmap(address.network_label_id, address.ip_address, True)
+    adjust_utilization(
+        address.network_label_id,
+        assigned=1,
+        reserved=-1 if was_reserved else 0,
+    )
+    return address
@@ -1,5 +1,15 @@
 from django.urls import path
-from .views import HostListView, AnsibleInventoryView
+from .views import (
+    HostListView,
+    HostImportView,
+    AnsibleInventoryView,
+    InventoryHostView,
+    NetworkAllocateView,
+    NetworkReleaseView,
+    NetworkRangesView,
+    NetworkUtilizationView,
+    NetworkLookupView,
+)
 
 urlpatterns = [
     path(
@@ -7,9 +17,44 @@ urlpatterns = [
         HostListView.as_view(),
         name="host-list",
     ),
+    path(
+        "hosts/import/",
+        HostImportView.as_view(),
+        name="host-import",
+    ),
     path(
         "inventory/",
         AnsibleInventoryView.as_view(),
         name="host-management",
     ),
+    path(
+        "inventory/host/<str:name>/",
+        InventoryHostView.as_view(),
+        name="inventory-host",
+    ),
+    path(
+        "networks/utilization/",
+        NetworkUtilizationView.as_view(),
+        name="network-utilization",
+    ),
+    path(
+        "networks/lookup/",
+        NetworkLookupView.as_view(),
+        name="network-lookup",
+    ),
+    path(
+        "networks/<int:pk>/allocate/",
+        NetworkAllocateView.as_view(),
+        name="network-allocate",
+    ),
+    path(
+        "networks/<int:pk>/release/",
+        NetworkReleaseView.as_view(),
+        name="network-release",
+    ),
+    path(
+        "networks/<int:pk>/ranges/",
+        NetworkRangesView.as_view(),
+        name="network-ranges",
+    ),
 ]
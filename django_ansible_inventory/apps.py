@@ -9,3 +9,22 @@ class DjangoAnsibleInventoryConfig(AppConfig):
     def ready(self):
         # Import signals here
         from . import signals
+
+        from django.conf import settings
+
+        # Optionally expire IP reservations from a thread in this process
+        # instead of running `manage.py expire_reservations` from cron
+        interval = getattr(
+            settings, "ANSIBLE_INVENTORY_RESERVATION_SWEEP_INTERVAL", None
+        )
+        if interval:
+            from django.core.signals import request_started
+
+            from .sweeper import start_sweeper_on_request
+
+            # Started by the first request, so only processes serving the
+            # app run it, not migrate and other management commands
+            request_started.connect(
+                start_sweeper_on_request,
+                dispatch_uid="django_ansible_inventory.sweeper",
+            )
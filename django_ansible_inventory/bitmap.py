@@ -0,0 +1,207 @@
+import threading
+from typing import Dict, Iterator, Optional, Tuple
+
+from django.db import transaction
+from netaddr import IPAddress, IPNetwork
+
+from .snapshots import CACHE_PREFIX, get_cache, get_token
+
+# Largest network (in addresses) tracked with a bitmap: 2 MiB of bits
+MAX_BITMAP_SIZE = 2**24
+
+
+class AllocationBitmap:
+    """
+    One bit per address of a network, keyed by the address offset from the
+    start of the network. A set bit means the address can not be handed
+    out, either because it is assigned or because it ends in 0 or 255.
+    """
+
+    def __init__(self, network):
+        self.network = IPNetwork(network)
+        self.first = self.network.first
+        self.size = self.network.size
+        if self.size > MAX_BITMAP_SIZE:
+            raise ValueError(f"Network {network} is too large for a bitmap")
+
+        self.bits = bytearray((self.size + 7) // 8)
+        # Number of assigned addresses
+        self.used = 0
+        # Lowest byte that may contain a free bit
+        self._hint = 0
+
+        # Offsets past the end of the network are never free
+        for offset in range(self.size, len(self.bits) * 8):
+            self._set(offset)
+        # Addresses ending in 0 or 255 are commonly reserved
+        self._mask = 0xFF if self.network.version == 4 else 0xFFFF
+        for base in range(
+            self.first & ~self._mask, self.first + self.size, self._mask + 1
+        ):
+            for address in (base, base + 255):
+                if self.first <= address < self.first + self.size:
+                    self._set(address - self.first)
+
+    @classmethod
+    def from_addresses(cls, network, assigned_ips):
+        bitmap = cls(network)
+        for ip in assigned_ips:
+            bitmap.mark_used(ip)
+        return bitmap
+
+    def _set(self, offset):
+        self.bits[offset >> 3] |= 1 << (offset & 7)
+
+    def _offset(self, ip) -> Optional[int]:
+        offset = int(IPAddress(ip)) - self.first
+        if 0 <= offset < self.size:
+            return offset
+        return None
+
+    def _is_set(self, offset) -> bool:
+        return bool(self.bits[offset >> 3] & (1 << (offset & 7)))
+
+    def is_free(self, ip) -> bool:
+        offset = self._offset(ip)
+        return offset is not None and not self._is_set(offset)
+
+    def mark_used(self, ip):
+        offset = self._offset(ip)
+        if offset is not None and not self._is_set(offset):
+            self._set(offset)
+            self.used += 1
+
+    def mark_free(self, ip):
+        offset = self._offset(ip)
+        if offset is None or not self._is_set(offset):
+            return
+        if (self.first + offset) & self._mask in (0, 255):
+            return
+        self.bits[offset >> 3] &= ~(1 << (offset & 7))
+        self.used -= 1
+        self._hint = min(self._hint, offset >> 3)
+
+    def count_free(self) -> int:
+        return (len(self.bits) * 8) - int.from_bytes(self.bits, "little").bit_count()
+
+    def iter_free(self) -> Iterator[IPAddress]:
+        """
+        Yields free addresses in ascending order.
+        """
+        index = self._hint
+        bits = self.bits
+        while index < len(bits):
+            # Skip full bytes at C speed
+            remaining = bits[index:].lstrip(b"\xff")
+            if not remaining:
+                break
+            index = len(bits) - len(remaining)
+            byte = bits[index]
+            for bit in range(8):
+                if not byte & (1 << bit):
+                    yield IPAddress(
+                        self.first + (index << 3) + bit,
+                        self.network.version,
+                    )
+            index += 1
+
+    def first_free(self, count=1):
+        """
+        Returns up to `count` free addresses, lowest first.
+        """
+        if count < 1:
+            return []
+        free = []
+        for ip in self.iter_free():
+            free.append(ip)
+            if len(free) == count:
+                break
+        if free:
+            self._hint = (int(free[0]) - self.first) >> 3
+        else:
+            self._hint = len(self.bits)
+        return free
+
+
+# Bitmaps are kept per process and validated against a token in the shared
+# cache (see snapshots.get_token), so a change made by one process is seen
+# by the others
+_bitmaps: Dict[int, Tuple[str, AllocationBitmap]] = {}
+_lock = threading.Lock()
+
+
+def _revision_key(network_label_id):
+    return f"{CACHE_PREFIX}:bitmap:{network_label_id}"
+
+
+def get_bitmap(network_label) -> AllocationBitmap:
+    """
+    Returns the allocation bitmap of a NetworkLabel, building it with one
+    query when this process has no current copy.
+    """
+    from .models import NetworkAddress
+
+    revision = get_token(_revision_key(network_label.pk))
+
+    with _lock:
+        cached = _bitmaps.get(network_label.pk)
+    if (
+        cached
+        and cached[0] == revision
+        and str(cached[1].network) == str(IPNetwork(network_label.network))
+    ):
+        return cached[1]
+
+    bitmap = AllocationBitmap.from_addresses(
+        network_label.network,
+        NetworkAddress.objects.filter(
+            network_label_id=network_label.pk,
+            is_assigned=True,
+        ).values_list("ip_address", flat=True),
+    )
+    with _lock:
+        _bitmaps[network_label.pk] = (revision, bitmap)
+    return bitmap
+
+
+def update_bitmap(network_label_id, ip, assigned):
+    """
+    Records that an address was assigned or released, once the current
+    transaction commits. The local bitmap is updated in place when it was
+    current, otherwise it is rebuilt on next use.
+    """
+    transaction.on_commit(lambda: _apply_update(network_label_id, ip, assigned))
+
+
+def _apply_update(network_label_id, ip, assigned):
+    try:
+        revision = get_cache().incr(_revision_key(network_label_id))
+    except ValueError:
+        # No revision yet, so no process holds a bitmap of this network
+        revision = None
+
+    with _lock:
+        cached = _bitmaps.pop(network_label_id, None)
+        # Only the revision right before ours means no other process
+        # changed the network since this bitmap was built
+        if cached and revision is not None and cached[0] == revision - 1:
+            bitmap = cached[1]
+            if assigned:
+                bitmap.mark_used(ip)
+            else:
+                bitmap.mark_free(ip)
+            _bitmaps[network_label_id] = (revision, bitmap)
+
+
+def invalidate_bitmap(network_label_id):
+    """
+    Drops the bitmaps of a network in every process once the current
+    transaction commits, e.g. after a queryset update or bulk insert.
+    """
+    transaction.on_commit(lambda: _drop_bitmap(network_label_id))
+
+
+def _drop_bitmap(network_label_id):
+    get_cache().delete(_revision_key(network_label_id))
+    with _lock:
+        _bitmaps.pop(network_label_id, None)
@@ -1,19 +1,81 @@
 #!/usr/bin/env python3
 
 import requests
+from requests.adapters import HTTPAdapter
 import argparse
 import json
-from typing import Dict, List, Any
+import os
+import tempfile
+import time
+from typing import Dict, List, Any, Optional
 
 API_BASE_URL = "http://jupiter.home.arpa/api"
 
+# Local inventory cache, shared by every invocation of this script
+CACHE_PATH = os.environ.get(
+    "ANSIBLE_INVENTORY_CACHE_PATH",
+    os.path.expanduser("~/.cache/django-ansible-inventory/inventory.json"),
+)
+CACHE_TTL = int(os.environ.get("ANSIBLE_INVENTORY_CACHE_TTL", "300"))
+REQUEST_TIMEOUT = 30
+
+# Reuse connections for every request made by this process
+session = requests.Session()
+adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+session.mount("http://", adapter)
+session.mount("https://", adapter)
+
+
+def fetch_hosts(etag: Optional[str] = None) -> requests.Response:
+    headers = {"If-None-Match": etag} if etag else {}
+    response = session.get(
+        f"{API_BASE_URL}/hosts/",
+        headers=headers,
+        timeout=REQUEST_TIMEOUT,
+    )
+    if response.status_code != 304:
+        response.raise_for_status()
+    return response
+
 
-def fetch_hosts() -> List[Dict[str, Any]]:
-    response = requests.get(f"{API_BASE_URL}/hosts/")
+def fetch_host_vars(host_name: str) -> Dict[str, Any]:
+    response = session.get(
+        f"{API_BASE_URL}/inventory/host/{host_name}/",
+        timeout=REQUEST_TIMEOUT,
+    )
+    if response.status_code == 404:
+        return {}
     response.raise_for_status()
     return response.json()
 
 
+def read_cache() -> Optional[Dict[str, Any]]:
+    try:
+        with open(CACHE_PATH) as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError):
+        return None
+
+
+def is_fresh(cache: Dict[str, Any]) -> bool:
+    return time.time() - cache.get("fetched_at", 0) < CACHE_TTL
+
+
+def write_cache(cache: Dict[str, Any]) -> None:
+    # Write to a temporary file and rename it so concurrent readers never
+    # see a partially written cache
+    cache_dir = os.path.dirname(CACHE_PATH)
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as tmp_file:
+            json.dump(cache, tmp_file)
+        os.replace(tmp_path, CACHE_PATH)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
 def build_inventory(hosts: List[Dict[str, Any]]) -> Dict[str, Any]:
     inventory: Dict[str, Dict[str, Any]] = {"_meta": {"hostvars": {}}}
 
@@ -39,6 +101,28 @@ def build_inventory(hosts: List[Dict[str, Any]]) -> Dict[str, Any]:
     return inventory
 
 
+def load_inventory(refresh: bool = False) -> Dict[str, Any]:
+    """
+    Returns the inventory from the local cache while it is fresh, otherwise
+    revalidates it against the API using the stored ETag.
+    """
+    cache = read_cache()
+    if cache and not refresh and is_fresh(cache):
+        return cache["inventory"]
+
+    response = fetch_hosts(etag=cache.get("etag") if cache else None)
+    if cache and response.status_code == 304:
+        cache["fetched_at"] = time.time()
+    else:
+        cache = {
+            "etag": response.headers.get("ETag"),
+            "fetched_at": time.time(),
+            "inventory": build_inventory(response.json()),
+        }
+    write_cache(cache)
+    return cache["inventory"]
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Ansible Dynamic Inventory Script",
@@ -52,24 +136,26 @@ def main():
         "--host",
         help="Get variables for a specific host",
     )
+    parser.add_argument(
+        "--refresh-cache",
+        action="store_true",
+        help="Revalidate the local cache even if it has not expired",
+    )
 
     args = parser.parse_args()
 
-    hosts = fetch_hosts()
-
     if args.list:
-        inventory = build_inventory(hosts)
+        inventory = load_inventory(refresh=args.refresh_cache)
         print(json.dumps(inventory, indent=4))
     elif args.host:
-        # Fetch and display the variables for the specified host
-        host_data = next(
-            (host for host in hosts if host["name"] == args.host),
-            None,
-        )
-        if host_data:
-            print(json.dumps(host_data["host_vars"], indent=4))
+        # Serve the variables for the specified host from the cached
+        # inventory, or look up just that host when the cache is stale
+        cache = read_cache()
+        if cache and not args.refresh_cache and is_fresh(cache):
+            host_vars = cache["inventory"]["_meta"]["hostvars"].get(args.host, {})
         else:
-            print(json.dumps({}, indent=4))
+            host_vars = fetch_host_vars(args.host)
+        print(json.dumps(host_vars, indent=4))
     else:
         print(json.dumps({}, indent=4))
 
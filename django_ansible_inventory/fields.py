@@ -1,4 +1,59 @@
-from django.db import models
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.db import models, transaction
+
+# Primary key of the default item of each CommonFields model, kept per
+# process and validated against a token in the shared cache
+_defaults: Dict[str, Tuple[int, Optional[int]]] = {}
+# When this process last read the token, and its value
+_defaults_checked: Tuple[float, Optional[int]] = (0.0, None)
+_defaults_lock = threading.Lock()
+
+
+def _defaults_key():
+    from .snapshots import CACHE_PREFIX
+
+    return f"{CACHE_PREFIX}:defaults"
+
+
+def _defaults_revision():
+    # A new Host() asks for several defaults; the token is read from the
+    # shared cache at most once per check interval, not once per default
+    global _defaults_checked
+    from .snapshots import get_token
+
+    now = time.monotonic()
+    with _defaults_lock:
+        checked_at, revision = _defaults_checked
+    interval = getattr(settings, "ANSIBLE_INVENTORY_DEFAULTS_CHECK_INTERVAL", 1)
+    if revision is not None and now - checked_at < interval:
+        return revision
+
+    revision = get_token(_defaults_key())
+    with _defaults_lock:
+        _defaults_checked = (now, revision)
+    return revision
+
+
+def invalidate_defaults():
+    """
+    Drops the cached defaults in every process once the current transaction
+    commits.
+    """
+    transaction.on_commit(_drop_defaults)
+
+
+def _drop_defaults():
+    global _defaults_checked
+    from .snapshots import get_cache
+
+    get_cache().delete(_defaults_key())
+    with _defaults_lock:
+        _defaults.clear()
+        _defaults_checked = (0.0, None)
 
 
 class LowerCharField(models.CharField):
@@ -43,3 +98,48 @@ class CommonFields(models.Model):
 
     class Meta:
         abstract = True
+        constraints = [
+            models.UniqueConstraint(
+                fields=["item_default"],
+                condition=models.Q(item_default=True),
+                name="%(app_label)s_%(class)s_single_default",
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        manager = self.__class__._default_manager
+        with transaction.atomic():
+            # The first enabled item becomes the default
+            if not manager.filter(enabled=True).exists():
+                self.item_default = True
+                self.enabled = True
+            if self.item_default:
+                # Clear the previous default with one UPDATE; the unique
+                # constraint rejects a concurrent second default
+                manager.filter(item_default=True).exclude(pk=self.pk).update(
+                    item_default=False
+                )
+            super().save(*args, **kwargs)
+
+    @classmethod
+    def get_default_pk(cls):
+        """
+        Returns the primary key of the item marked as default, or None. The
+        answer is cached until an item of any CommonFields model is saved or
+        deleted, so creating many hosts does not query each lookup table;
+        other processes see the change within
+        ANSIBLE_INVENTORY_DEFAULTS_CHECK_INTERVAL seconds.
+        """
+        revision = _defaults_revision()
+        with _defaults_lock:
+            cached = _defaults.get(cls._meta.label)
+        if cached and cached[0] == revision:
+            return cached[1]
+
+        try:
+            pk = cls.objects.values_list("pk", flat=True).get(item_default=True)
+        except cls.DoesNotExist:
+            pk = None
+        with _defaults_lock:
+            _defaults[cls._meta.label] = (revision, pk)
+        return pk
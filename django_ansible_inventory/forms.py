@@ -1,10 +1,10 @@
 from django import forms
-from netaddr import IPAddress as NetIPAddress, IPNetwork
 from django.utils import timezone
-from datetime import timedelta
-from django.db.models import Q
+from netaddr import IPAddress as NetIPAddress, IPNetwork
 
-from .models import Host, NetworkAddress
+from .models import Host, NetworkAddress, NetworkLabel
+from .allocation import AllocationError, assign
+from .netindex import find_network
 
 
 class HostAdminForm(forms.ModelForm):
@@ -28,13 +28,10 @@ class HostAdminForm(forms.ModelForm):
         self.current_user = kwargs.pop("current_user", None)
         super().__init__(*args, **kwargs)
 
-        user = self.current_user
+        # A manually entered IP selects its VLAN, see clean()
+        self.fields["vlan"].required = False
 
-        # Clean up expired reservations
-        NetworkAddress.objects.filter(
-            is_reserved=True,
-            reservation_timestamp__lt=timezone.now() - timedelta(minutes=10),
-        ).update(is_reserved=False, reserved_by=None, reservation_timestamp=None)
+        user = self.current_user
 
         # Get VLAN ID from form data or instance
         if "vlan" in self.data and self.data.get("vlan"):
@@ -46,10 +43,10 @@ class HostAdminForm(forms.ModelForm):
 
         # Set up the queryset for ip_address field
         if vlan_id:
-            # Build the base queryset
+            # Build the base queryset; expired reservations count as free
             queryset = NetworkAddress.objects.filter(
-                network_label_id=vlan_id, is_assigned=False
-            ).filter(Q(is_reserved=False) | Q(reserved_by=user))
+                network_label_id=vlan_id,
+            ).free(user=user)
 
             # Include the selected IP in the queryset
             selected_ip_id = self.data.get("ip_address") or self.initial.get(
@@ -58,7 +55,7 @@ class HostAdminForm(forms.ModelForm):
             if selected_ip_id:
                 queryset = queryset | NetworkAddress.objects.filter(pk=selected_ip_id)
 
-            self.fields["ip_address"].queryset = queryset.distinct()
+            self.fields["ip_address"].queryset = queryset.distinct().order_by("ip_key")
         else:
             self.fields["ip_address"].queryset = NetworkAddress.objects.none()
 
@@ -71,6 +68,15 @@ class HostAdminForm(forms.ModelForm):
 
         # Handle manual IP entry
         if use_manual_ip:
+            if manual_ip and not vlan:
+                # Select the most specific network containing the IP
+                found = find_network(manual_ip)
+                if found is None:
+                    raise forms.ValidationError(
+                        f"No network contains the IP {manual_ip}."
+                    )
+                vlan = cleaned_data["vlan"] = NetworkLabel.objects.get(pk=found[0])
+
             if manual_ip:
                 # Ensure the manual IP is valid within the selected VLAN's network
                 if vlan:
@@ -88,10 +94,11 @@ class HostAdminForm(forms.ModelForm):
                             f"The IP address {manual_ip} is already assigned to another host."
                         )
 
-                    # If the IP is valid and not assigned, create or retrieve it
+                    # If the IP is valid and not assigned, create or retrieve it;
+                    # it is marked assigned when the host is saved
                     ip, created = NetworkAddress.objects.get_or_create(
                         ip_address=manual_ip,
-                        defaults={"is_assigned": True, "network_label": vlan},
+                        defaults={"network_label": vlan},
                     )
                     cleaned_data["ip_address"] = (
                         ip  # Assign the manually entered IP to the form
@@ -103,10 +110,32 @@ class HostAdminForm(forms.ModelForm):
             else:
                 raise forms.ValidationError("Please enter a valid IP address manually.")
         else:
+            if not vlan:
+                raise forms.ValidationError("Please select a VLAN.")
             if not ip_address:
                 raise forms.ValidationError(
                     "Please select an IP address from the list."
                 )
+            if ip_address.is_assigned and ip_address.pk != self.instance.ip_address_id:
+                raise forms.ValidationError(
+                    f"The IP address {ip_address} is already assigned to another host."
+                )
+
+        ip_address = cleaned_data.get("ip_address")
+        if (
+            ip_address
+            and not self.errors
+            and not (
+                ip_address.pk == self.instance.ip_address_id and ip_address.is_assigned
+            )
+        ):
+            # Claim the new IP now, so losing it to another host is reported
+            # on the form instead of failing in save(); the admin runs
+            # validation and save in one transaction
+            try:
+                assign(ip_address)
+            except AllocationError as error:
+                raise forms.ValidationError(str(error))
 
         return cleaned_data
 
@@ -114,23 +143,17 @@ class HostAdminForm(forms.ModelForm):
         instance = super().save(commit=False)
         ip_address = self.cleaned_data.get("ip_address")
 
-        # If editing an existing instance, unassign the old IP
+        # If editing an existing instance, unassign the old IP; the new one
+        # was assigned by clean()
         if instance.pk:
             old_instance = Host.objects.get(pk=instance.pk)
             old_ip = old_instance.ip_address
             if old_ip and old_ip != ip_address:
                 # Unassign the old IP
                 old_ip.is_assigned = False
+                old_ip.last_used = timezone.now()
                 old_ip.save()
 
-        if ip_address:
-            # Assign the new IP
-            ip_address.is_assigned = True
-            ip_address.is_reserved = False
-            ip_address.reserved_by = None
-            ip_address.reservation_timestamp = None
-            ip_address.save()
-
         if commit:
             instance.save()
             self.save_m2m()
@@ -0,0 +1,820 @@
+import ast
+import csv
+import io
+import json
+import re
+import shlex
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from django.db import transaction
+from netaddr import AddrFormatError, IPAddress, IPNetwork
+
+from .bitmap import invalidate_bitmap
+from .models import (
+    AnsibleGroup,
+    BusinessUnit,
+    Environment,
+    Host,
+    HostClass,
+    HostStatus,
+    HostType,
+    NetworkAddress,
+    NetworkLabel,
+    Purpose,
+    SupportGroup,
+    SupportLevel,
+)
+from .netindex import find_network
+from .snapshots import invalidate_inventory
+from .utilization import invalidate_utilization
+
+try:
+    import yaml
+except ImportError:  # PyYAML is optional, install the "yaml" extra
+    yaml = None
+
+FORMATS = ("csv", "yaml", "ini")
+DEFAULT_BATCH_SIZE = 1000
+
+# Host fields that reference a lookup model, and the model field holding
+# the name used in import files
+LOOKUPS = {
+    "host_type": (HostType, "host_type"),
+    "environment": (Environment, "environment"),
+    "purpose": (Purpose, "purpose"),
+    "host_status": (HostStatus, "host_status"),
+    "host_class": (HostClass, "host_class"),
+    "business_unit": (BusinessUnit, "business_unit"),
+    "support_group": (SupportGroup, "group"),
+    "support_level": (SupportLevel, "level"),
+}
+
+# Columns of a CSV file that are not host variables
+CSV_COLUMNS = {
+    "name",
+    "groups",
+    "ip",
+    "ip_address",
+    "vlan",
+    "enabled",
+    "host_vars",
+    "short_description",
+    *LOOKUPS,
+}
+
+# Groups every Ansible host belongs to implicitly
+IMPLICIT_GROUPS = {"all", "ungrouped"}
+
+# Host names Ansible can target: DNS names and IPv4 or IPv6 addresses
+# (which may start or end with "::"), without whitespace, commas or brackets
+HOST_NAME_RE = re.compile(r"^[a-z0-9_:]([a-z0-9_.:-]{0,253}[a-z0-9_:])?$")
+
+# Formats of request bodies sent without a file name, by media type
+CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/yaml": "yaml",
+    "application/x-yaml": "yaml",
+    "text/yaml": "yaml",
+    "text/x-yaml": "yaml",
+}
+
+
+class HostImportError(Exception):
+    pass
+
+
+def guess_format(filename: str) -> str:
+    """
+    Returns the import format matching a file name, INI for anything that
+    is not CSV or YAML, like Ansible's own `hosts` files.
+    """
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if extension == "csv":
+        return "csv"
+    if extension in ("yml", "yaml"):
+        return "yaml"
+    return "ini"
+
+
+def format_for_content_type(content_type: str) -> Optional[str]:
+    """
+    Returns the import format of a media type, e.g. "csv" for
+    `text/csv; charset=utf-8`, or None when it does not tell.
+    """
+    return CONTENT_TYPES.get(content_type.split(";", 1)[0].strip().lower())
+
+
+def _parse_bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "yes", "y", "on")
+
+
+def _split_groups(value) -> List[str]:
+    if isinstance(value, (list, tuple)):
+        return [str(group).lower() for group in value if group]
+    return [group.lower() for group in re.split(r"[,;\s]+", value or "") if group]
+
+
+def _host_record(fields: Dict[str, Any], source: str) -> Dict[str, Any]:
+    """
+    Builds a host record from a flat mapping, e.g. a CSV row. Unknown keys
+    become host variables. The record only has groups and host_vars when
+    the source has columns for them, so updates keep them otherwise.
+    """
+    host_vars = fields.get("host_vars") or {}
+    if isinstance(host_vars, str):
+        try:
+            host_vars = json.loads(host_vars)
+        except ValueError:
+            raise HostImportError(f"{source}: host_vars is not valid JSON")
+    if not isinstance(host_vars, dict):
+        raise HostImportError(f"{source}: host_vars must be a mapping")
+    host_vars = {
+        **{
+            key: value
+            for key, value in fields.items()
+            if key not in CSV_COLUMNS and key and value not in (None, "")
+        },
+        **host_vars,
+    }
+
+    record = {
+        "source": source,
+        "name": str(fields.get("name") or "").strip().lower(),
+        "ip": fields.get("ip") or fields.get("ip_address") or None,
+    }
+    if "groups" in fields:
+        record["groups"] = _split_groups(fields["groups"])
+    if "host_vars" in fields or any(key and key not in CSV_COLUMNS for key in fields):
+        record["host_vars"] = host_vars
+    if fields.get("enabled") not in (None, ""):
+        record["enabled"] = _parse_bool(fields["enabled"])
+    for field in ("vlan", "short_description", *LOOKUPS):
+        if fields.get(field) not in (None, ""):
+            record[field] = str(fields[field]).strip()
+    return record
+
+
+def parse_csv(stream) -> Tuple[Iterator[Dict[str, Any]], Dict[str, dict]]:
+    """
+    Parses a CSV file with a header row, one host per row. Rows are read
+    lazily, so the file is never held in memory as a whole.
+    """
+    reader = csv.DictReader(stream)
+
+    def records():
+        for row in reader:
+            yield _host_record(
+                {(key or "").strip().lower(): value for key, value in row.items()},
+                f"line {reader.line_num}",
+            )
+
+    return records(), {}
+
+
+def _ini_value(value: str):
+    # Ansible evaluates INI variables as Python literals when it can
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return value
+
+
+def _ini_vars(tokens: Iterable[str], source: str) -> Dict[str, Any]:
+    variables = {}
+    for token in tokens:
+        if "=" not in token:
+            raise HostImportError(f"{source}: expected key=value, got {token!r}")
+        key, value = token.split("=", 1)
+        variables[key] = _ini_value(value)
+    return variables
+
+
+def _expand_hosts(pattern: str) -> List[str]:
+    # Ansible host ranges, e.g. web[01:20].example.com
+    match = re.search(r"\[(\d+):(\d+)\]", pattern)
+    if not match:
+        return [pattern]
+    first, last = match.groups()
+    width = len(first) if first.startswith("0") else 0
+    return [
+        f"{pattern[: match.start()]}{number:0{width}d}{pattern[match.end() :]}"
+        for number in range(int(first), int(last) + 1)
+    ]
+
+
+def _managed_ip(value) -> Optional[str]:
+    # ansible_host is often a DNS name, or an address outside the managed
+    # networks; only addresses a NetworkLabel contains are assigned
+    try:
+        ip = IPAddress(str(value).strip())
+    except (AddrFormatError, ValueError):
+        return None
+    if find_network(ip) is None:
+        return None
+    return str(ip)
+
+
+def _host_from_vars(name, groups, host_vars, source) -> Dict[str, Any]:
+    return {
+        "source": source,
+        "name": str(name).strip().lower(),
+        "groups": sorted(group for group in groups if group not in IMPLICIT_GROUPS),
+        "host_vars": host_vars,
+        "ip": (
+            _managed_ip(host_vars["ansible_host"])
+            if "ansible_host" in host_vars
+            else None
+        ),
+    }
+
+
+def _flatten_children(
+    members: Dict[str, Set[str]], children: Dict[str, Set[str]]
+) -> Dict[str, Set[str]]:
+    """
+    Returns the groups of each host including parent groups, since hosts of
+    a child group are members of its parents in Ansible.
+    """
+    parents: Dict[str, Set[str]] = {}
+    for parent, names in children.items():
+        for child in names:
+            parents.setdefault(child, set()).add(parent)
+
+    def ancestors(group, seen):
+        for parent in parents.get(group, ()):
+            if parent not in seen:
+                seen.add(parent)
+                ancestors(parent, seen)
+        return seen
+
+    expanded: Dict[str, Set[str]] = {}
+    for host, groups in members.items():
+        expanded[host] = set(groups)
+        for group in groups:
+            expanded[host] |= ancestors(group, set())
+    return expanded
+
+
+def parse_ini(stream) -> Tuple[Iterator[Dict[str, Any]], Dict[str, dict]]:
+    """
+    Parses an Ansible INI inventory. Child groups are flattened into their
+    parents; variables of the implicit `all` and `ungrouped` groups are not
+    imported.
+    """
+    members: Dict[str, Set[str]] = {}
+    host_vars: Dict[str, Dict[str, Any]] = {}
+    sources: Dict[str, str] = {}
+    children: Dict[str, Set[str]] = {}
+    group_vars: Dict[str, dict] = {}
+
+    group, kind = "ungrouped", "hosts"
+    for number, line in enumerate(stream, 1):
+        source = f"line {number}"
+        line = line.strip()
+        if not line or line[0] in "#;":
+            continue
+        if line.startswith("[") and line.endswith("]"):
+            group, _, kind = line[1:-1].strip().lower().partition(":")
+            kind = kind or "hosts"
+            if kind not in ("hosts", "vars", "children"):
+                raise HostImportError(f"{source}: unknown section type {kind!r}")
+            continue
+
+        if kind == "vars":
+            # Values of vars sections are not split, only evaluated
+            key, separator, value = line.partition("=")
+            if not separator:
+                raise HostImportError(f"{source}: expected key=value")
+            group_vars.setdefault(group, {})[key.strip()] = _ini_value(value.strip())
+            continue
+
+        try:
+            tokens = shlex.split(line, comments=True)
+        except ValueError as error:
+            raise HostImportError(f"{source}: {error}")
+        if not tokens:
+            continue
+        if kind == "children":
+            children.setdefault(group, set()).add(tokens[0].lower())
+        else:
+            variables = _ini_vars(tokens[1:], source)
+            for name in _expand_hosts(tokens[0].lower()):
+                members.setdefault(name, set()).add(group)
+                host_vars.setdefault(name, {}).update(variables)
+                sources.setdefault(name, source)
+
+    for name in IMPLICIT_GROUPS:
+        group_vars.pop(name, None)
+    expanded = _flatten_children(members, children)
+    records = (
+        _host_from_vars(name, expanded[name], host_vars[name], sources[name])
+        for name in members
+    )
+    return records, group_vars
+
+
+def _walk_yaml_group(name, data, path, members, host_vars, children, group_vars):
+    data = data or {}
+    if not isinstance(data, dict):
+        raise HostImportError(f"{path}: group {name!r} must be a mapping")
+    for key in ("hosts", "vars", "children"):
+        if not isinstance(data.get(key) or {}, dict):
+            raise HostImportError(f"{path}: {key} of group {name!r} must be a mapping")
+    for pattern, variables in (data.get("hosts") or {}).items():
+        if not isinstance(variables or {}, dict):
+            raise HostImportError(
+                f"{path}: variables of host {pattern!r} must be a mapping"
+            )
+        for host in _expand_hosts(str(pattern).lower()):
+            members.setdefault(host, set()).add(name)
+            host_vars.setdefault(host, {}).update(variables or {})
+    if data.get("vars"):
+        group_vars.setdefault(name, {}).update(data["vars"])
+    for child, child_data in (data.get("children") or {}).items():
+        child = str(child).lower()
+        children.setdefault(name, set()).add(child)
+        _walk_yaml_group(
+            child,
+            child_data,
+            f"{path}.{child}",
+            members,
+            host_vars,
+            children,
+            group_vars,
+        )
+
+
+def parse_yaml(stream) -> Tuple[Iterator[Dict[str, Any]], Dict[str, dict]]:
+    """
+    Parses either an Ansible YAML inventory (`all: {hosts, children, vars}`)
+    or a list of host mappings with the same keys as the CSV columns.
+    """
+    if yaml is None:
+        raise HostImportError(
+            "YAML imports need PyYAML, install django-ansible-inventory[yaml]"
+        )
+    try:
+        data = yaml.safe_load(stream)
+    except yaml.YAMLError as error:
+        raise HostImportError(f"Invalid YAML: {error}")
+
+    if isinstance(data, list):
+        return (
+            _host_record(
+                {str(key).lower(): value for key, value in (fields or {}).items()},
+                f"item {number}",
+            )
+            for number, fields in enumerate(data, 1)
+        ), {}
+    if not isinstance(data, dict):
+        raise HostImportError("A YAML inventory must be a mapping or a list")
+
+    members: Dict[str, Set[str]] = {}
+    host_vars: Dict[str, Dict[str, Any]] = {}
+    children: Dict[str, Set[str]] = {}
+    group_vars: Dict[str, dict] = {}
+    for name, group_data in data.items():
+        name = str(name).lower()
+        _walk_yaml_group(
+            name, group_data, name, members, host_vars, children, group_vars
+        )
+
+    for name in IMPLICIT_GROUPS:
+        group_vars.pop(name, None)
+    expanded = _flatten_children(members, children)
+    records = (
+        _host_from_vars(name, expanded[name], host_vars[name], name) for name in members
+    )
+    return records, group_vars
+
+
+PARSERS = {
+    "csv": parse_csv,
+    "ini": parse_ini,
+    "yaml": parse_yaml,
+}
+
+
+def parse_hosts(stream, format: str):
+    """
+    Returns (host records, group variables) parsed from a text stream.
+    """
+    if format not in PARSERS:
+        raise HostImportError(
+            f"Unknown format {format!r}, expected one of {', '.join(FORMATS)}"
+        )
+    return PARSERS[format](stream)
+
+
+def text_stream(file) -> io.TextIOBase:
+    """
+    Wraps an uploaded or opened binary file for the parsers.
+    """
+    return io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+
+
+class HostImporter:
+    """
+    Imports host records with a fixed number of queries: existing hosts,
+    groups, lookups and networks are loaded into memory maps once, and
+    new rows are written with batched bulk_create() calls, including the
+    Host.groups through table.
+
+    Hosts that already exist are skipped unless `update` is set, in which
+    case their variables, groups and given fields are replaced.
+    """
+
+    def __init__(self, update=False, batch_size=DEFAULT_BATCH_SIZE):
+        self.update = update
+        self.batch_size = batch_size
+
+    def _load(self):
+        self.groups = dict(AnsibleGroup.objects.values_list("name", "pk"))
+        self.group_vars = dict(AnsibleGroup.objects.values_list("name", "group_vars"))
+        self.networks = {
+            name: (pk, network)
+            for pk, name, network in NetworkLabel.objects.values_list(
+                "pk", "name", "network"
+            )
+        }
+        self.lookups = {}
+        for field, (model, name_field) in LOOKUPS.items():
+            self.lookups[field] = {
+                str(name).lower(): pk
+                for pk, name in model.objects.values_list("pk", name_field)
+            }
+        self.defaults = {
+            field: model.get_default_pk()
+            for field, (model, _) in LOOKUPS.items()
+            if Host._meta.get_field(field).has_default()
+        }
+
+        self.hosts = {}
+        for host in Host.objects.values(
+            "pk",
+            "name",
+            "enabled",
+            "host_vars",
+            "vlan_id",
+            "ip_address_id",
+            "ip_address__ip_address",
+            "short_description",
+            *(f"{field}_id" for field in LOOKUPS),
+        ).iterator(chunk_size=self.batch_size):
+            # Host names are not unique; the first one is updated
+            self.hosts.setdefault(host["name"], host)
+        self.host_groups: Dict[int, Set[str]] = {}
+        group_names = {pk: name for name, pk in self.groups.items()}
+        for host_id, group_id in Host.groups.through.objects.values_list(
+            "host_id", "ansiblegroup_id"
+        ).iterator(chunk_size=self.batch_size):
+            self.host_groups.setdefault(host_id, set()).add(group_names[group_id])
+
+    def _resolve_ip(self, record, errors) -> Optional[Tuple[str, int]]:
+        try:
+            ip = str(IPAddress(str(record["ip"]).strip()))
+        except (AddrFormatError, ValueError):
+            errors.append(f"{record['source']}: {record['ip']} is not an IP address")
+            return None
+
+        if record.get("vlan"):
+            network = self.networks.get(record["vlan"])
+            if network is None:
+                errors.append(f"{record['source']}: unknown VLAN {record['vlan']}")
+                return None
+            if IPAddress(ip) not in IPNetwork(network[1]):
+                errors.append(
+                    f"{record['source']}: {ip} is not in {record['vlan']} "
+                    f"({network[1]})"
+                )
+                return None
+            return ip, network[0]
+
+        found = find_network(ip)
+        if found is None:
+            errors.append(f"{record['source']}: no network contains {ip}")
+            return None
+        return ip, found[0]
+
+    def _plan(self, records):
+        """
+        Validates the records against the in-memory maps and returns the
+        hosts to create and update, the groups to create and the errors.
+        """
+        creates, updates, errors = [], [], []
+        unchanged = skipped = 0
+        seen: Set[str] = set()
+        ips: Dict[str, str] = {}
+
+        for record in records:
+            name, source = record["name"], record["source"]
+            if not name:
+                errors.append(f"{source}: host name is missing")
+                continue
+            if not HOST_NAME_RE.match(name):
+                errors.append(f"{source}: {name!r} is not a valid host name")
+                continue
+            if name in seen:
+                errors.append(f"{source}: {name} appears more than once")
+                continue
+            seen.add(name)
+
+            existing = self.hosts.get(name)
+            if existing is not None and not self.update:
+                skipped += 1
+                continue
+
+            values = {}
+            for field in LOOKUPS:
+                if field not in record:
+                    continue
+                pk = self.lookups[field].get(record[field].lower())
+                if pk is None:
+                    errors.append(f"{source}: unknown {field} {record[field]}")
+                values[f"{field}_id"] = pk
+            for field in ("enabled", "short_description"):
+                if field in record:
+                    values[field] = record[field]
+            if record.get("vlan") and not record.get("ip"):
+                network = self.networks.get(record["vlan"])
+                if network is None:
+                    errors.append(f"{source}: unknown VLAN {record['vlan']}")
+                else:
+                    values["vlan_id"] = network[0]
+            if record.get("ip"):
+                resolved = self._resolve_ip(record, errors)
+                if resolved:
+                    values["ip"], values["vlan_id"] = resolved
+                    if values["ip"] in ips:
+                        errors.append(
+                            f"{source}: {values['ip']} is also used by "
+                            f"{ips[values['ip']]}"
+                        )
+                    ips[values["ip"]] = name
+
+            if existing is None:
+                for field, default in self.defaults.items():
+                    if values.get(f"{field}_id") is None and default is None:
+                        errors.append(f"{source}: {field} is missing, no default")
+                creates.append(
+                    {
+                        "name": name,
+                        "groups": record.get("groups", []),
+                        "host_vars": record.get("host_vars", {}),
+                        **values,
+                    }
+                )
+                continue
+
+            changes = {}
+            for field, value in values.items():
+                old = (
+                    existing["ip_address__ip_address"]
+                    if field == "ip"
+                    else existing[field]
+                )
+                if value != old:
+                    changes[field] = (old, value)
+            # Only what the source provided replaces the current values
+            if "host_vars" in record and record["host_vars"] != existing["host_vars"]:
+                changes["host_vars"] = (existing["host_vars"], record["host_vars"])
+            if "groups" in record:
+                old_groups = sorted(self.host_groups.get(existing["pk"], ()))
+                if sorted(set(record["groups"])) != old_groups:
+                    changes["groups"] = (old_groups, sorted(set(record["groups"])))
+            if "ip" in changes and existing["ip_address__ip_address"]:
+                errors.append(
+                    f"{source}: {name} already has the IP "
+                    f"{existing['ip_address__ip_address']}, change it in the admin"
+                )
+            if not changes:
+                unchanged += 1
+            else:
+                updates.append({"host": existing, "values": values, "changes": changes})
+
+        # Addresses that belong to another host are conflicts
+        ip_owners = {}
+        ip_list = list(ips)
+        for start in range(0, len(ip_list), self.batch_size):
+            ip_owners.update(
+                NetworkAddress.objects.filter(
+                    ip_address__in=ip_list[start : start + self.batch_size],
+                    is_assigned=True,
+                ).values_list("ip_address", "host__name")
+            )
+        for ip, owner in ip_owners.items():
+            if owner != ips[ip] or ips[ip] not in self.hosts:
+                errors.append(f"{ip} of {ips[ip]} is already assigned")
+
+        return creates, updates, unchanged, skipped, errors
+
+    def run(self, records, group_vars=None, dry_run=False) -> Dict[str, Any]:
+        """
+        Imports host records from parse_hosts() and returns a report. When
+        a record is invalid nothing is written and the report lists the
+        errors; with `dry_run` the report only lists the changes.
+        """
+        group_vars = group_vars or {}
+        self._load()
+        creates, updates, unchanged, skipped, errors = self._plan(records)
+
+        wanted_groups = set(group_vars)
+        for host in creates:
+            wanted_groups.update(host["groups"])
+        for update in updates:
+            wanted_groups.update(update["changes"].get("groups", ((), ()))[1])
+        new_groups = sorted(wanted_groups - set(self.groups))
+
+        report = {
+            "created": len(creates),
+            "updated": len(updates),
+            "unchanged": unchanged,
+            "skipped": skipped,
+            "groups_created": len(new_groups),
+            "errors": errors,
+            "changes": [
+                {
+                    "action": "create",
+                    "name": host["name"],
+                    "groups": host["groups"],
+                    "ip": host.get("ip"),
+                }
+                for host in creates
+            ]
+            + [
+                {
+                    "action": "update",
+                    "name": update["host"]["name"],
+                    "changes": {
+                        field: {"old": old, "new": new}
+                        for field, (old, new) in update["changes"].items()
+                    },
+                }
+                for update in updates
+            ],
+        }
+        if errors or dry_run:
+            return report
+
+        with transaction.atomic():
+            self._write(creates, updates, new_groups, group_vars)
+        invalidate_inventory()
+        return report
+
+    def _write(self, creates, updates, new_groups, group_vars):
+        # Groups
+        AnsibleGroup.objects.bulk_create(
+            [
+                AnsibleGroup(name=name, group_vars=group_vars.get(name, {}))
+                for name in new_groups
+            ],
+            batch_size=self.batch_size,
+        )
+        if self.update:
+            changed = [
+                name
+                for name, variables in group_vars.items()
+                if name not in new_groups and self.group_vars.get(name) != variables
+            ]
+            AnsibleGroup.objects.bulk_update(
+                [
+                    AnsibleGroup(pk=self.groups[name], group_vars=group_vars[name])
+                    for name in changed
+                ],
+                ["group_vars"],
+                batch_size=self.batch_size,
+            )
+        self.groups = dict(AnsibleGroup.objects.values_list("name", "pk"))
+
+        # Addresses
+        addresses = {host["ip"]: host["vlan_id"] for host in creates if host.get("ip")}
+        for update in updates:
+            if "ip" in update["changes"]:
+                addresses[update["values"]["ip"]] = update["values"]["vlan_id"]
+        address_ids = self._assign_addresses(addresses)
+
+        # Hosts
+        new_hosts = []
+        for host in creates:
+            fields = {
+                key: value for key, value in host.items() if key not in ("groups", "ip")
+            }
+            for field, default in self.defaults.items():
+                if fields.get(f"{field}_id") is None:
+                    fields[f"{field}_id"] = default
+            new_hosts.append(
+                Host(ip_address_id=address_ids.get(host.get("ip")), **fields)
+            )
+        Host.objects.bulk_create(new_hosts, batch_size=self.batch_size)
+        if any(host.pk is None for host in new_hosts):
+            # Databases that do not return primary keys from bulk inserts
+            pks = dict(
+                Host.objects.filter(
+                    name__in=[host.name for host in new_hosts]
+                ).values_list("name", "pk")
+            )
+            for host in new_hosts:
+                host.pk = pks[host.name]
+
+        Membership = Host.groups.through
+        memberships = [
+            Membership(host_id=host.pk, ansiblegroup_id=self.groups[group])
+            for host, record in zip(new_hosts, creates)
+            for group in set(record["groups"])
+        ]
+
+        changed_hosts = []
+        fields: Set[str] = set()
+        regrouped = []
+        for update in updates:
+            host = Host(pk=update["host"]["pk"])
+            for field, (_, value) in update["changes"].items():
+                if field == "groups":
+                    regrouped.append(host.pk)
+                    memberships.extend(
+                        Membership(host_id=host.pk, ansiblegroup_id=self.groups[group])
+                        for group in value
+                    )
+                elif field == "ip":
+                    host.ip_address_id = address_ids[value]
+                    fields.add("ip_address_id")
+                else:
+                    setattr(host, field, value)
+                    fields.add(field)
+            changed_hosts.append(host)
+        if fields:
+            # Hosts without a change to a field keep their current value
+            for host, update in zip(changed_hosts, updates):
+                for field in fields:
+                    if field == "ip_address_id":
+                        if host.ip_address_id is None:
+                            host.ip_address_id = update["host"]["ip_address_id"]
+                    elif field not in update["changes"]:
+                        setattr(host, field, update["host"][field])
+            Host.objects.bulk_update(
+                changed_hosts,
+                [field.removesuffix("_id") for field in fields],
+                batch_size=self.batch_size,
+            )
+
+        for start in range(0, len(regrouped), self.batch_size):
+            Membership.objects.filter(
+                host_id__in=regrouped[start : start + self.batch_size]
+            ).delete()
+        Membership.objects.bulk_create(
+            memberships,
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+
+    def _assign_addresses(self, addresses: Dict[str, int]) -> Dict[str, int]:
+        """
+        Marks the given addresses as assigned, creating the rows that do
+        not exist yet, and returns their primary keys by address.
+        """
+        ips = list(addresses)
+        ids = {}
+        for start in range(0, len(ips), self.batch_size):
+            ids.update(
+                NetworkAddress.objects.filter(
+                    ip_address__in=ips[start : start + self.batch_size]
+                ).values_list("ip_address", "pk")
+            )
+        NetworkAddress.objects.bulk_create(
+            [
+                NetworkAddress(
+                    ip_address=ip,
+                    network_label_id=addresses[ip],
+                    is_assigned=True,
+                )
+                for ip in ips
+                if ip not in ids
+            ],
+            batch_size=self.batch_size,
+        )
+        existing = list(ids.values())
+        for start in range(0, len(existing), self.batch_size):
+            NetworkAddress.objects.filter(
+                pk__in=existing[start : start + self.batch_size]
+            ).update(
+                is_assigned=True,
+                is_reserved=False,
+                reserved_by=None,
+                reservation_timestamp=None,
+                lease_token=None,
+            )
+        for start in range(0, len(ips), self.batch_size):
+            ids.update(
+                NetworkAddress.objects.filter(
+                    ip_address__in=ips[start : start + self.batch_size]
+                ).values_list("ip_address", "pk")
+            )
+
+        # Bulk writes send no signals
+        for network_label_id in set(addresses.values()):
+            invalidate_bitmap(network_label_id)
+            invalidate_utilization(network_label_id)
+        return ids
@@ -0,0 +1,111 @@
+from itertools import groupby
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from .models import AnsibleGroup, Host
+
+
+def get_inventory_hosts(tag: Optional[str] = None):
+    """
+    Returns the queryset of hosts that make up the inventory, optionally
+    limited to hosts belonging to a group carrying the given tag.
+    """
+    hosts = Host.objects.filter(enabled=True)
+    if tag:
+        hosts = hosts.filter(groups__tags__name=tag).distinct()
+    return hosts
+
+
+def build_inventory(tag: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Builds the Ansible inventory dict using a fixed number of queries
+    (hosts, host/group memberships and groups) regardless of the number of
+    hosts. Rows are read with values_list() so no model instances are built.
+    """
+    hosts = get_inventory_hosts(tag)
+    memberships = Host.groups.through.objects.filter(
+        host_id__in=hosts.values("pk"),
+    )
+
+    host_rows = {
+        pk: (name, host_vars)
+        for pk, name, host_vars in hosts.order_by("pk")
+        .values_list("pk", "name", "host_vars")
+        .iterator()
+    }
+    group_rows = {
+        pk: (name, group_vars)
+        for pk, name, group_vars in AnsibleGroup.objects.filter(
+            pk__in=memberships.values("ansiblegroup_id"),
+        ).values_list("pk", "name", "group_vars")
+    }
+
+    # Define the type of inventory to guide the linter
+    inventory: Dict[str, Dict[str, Any]] = {"_meta": {"hostvars": {}}}
+    hostvars = inventory["_meta"]["hostvars"]
+
+    for host_id, group_id in (
+        memberships.order_by("host_id", "pk")
+        .values_list("host_id", "ansiblegroup_id")
+        .iterator()
+    ):
+        # Rows added between the queries above are picked up next build
+        if host_id not in host_rows or group_id not in group_rows:
+            continue
+
+        host_name, host_vars = host_rows[host_id]
+        group_name, group_vars = group_rows[group_id]
+
+        group = inventory.get(group_name)
+        if group is None:
+            group = inventory[group_name] = {
+                "hosts": [],
+                "vars": group_vars,
+            }
+
+        group["hosts"].append(
+            {
+                "name": host_name,
+                "vars": host_vars,
+            }
+        )
+
+        # Add host variables to _meta
+        hostvars[host_name] = host_vars
+
+    return inventory
+
+
+def iter_inventory_groups(
+    tag: Optional[str] = None, chunk_size: int = 2000
+) -> Iterator[Tuple[str, Dict[str, Any], Iterator[Tuple[int, str, Dict[str, Any]]]]]:
+    """
+    Yields (group name, group vars, hosts) for every group of the inventory
+    in name order, where hosts yields (host id, host name, host vars).
+    Memberships are read with one chunked query, so only the groups are
+    held in memory.
+    """
+    hosts = get_inventory_hosts(tag)
+    memberships = Host.groups.through.objects.filter(
+        host_id__in=hosts.values("pk"),
+    )
+    group_rows = {
+        pk: (name, group_vars)
+        for pk, name, group_vars in AnsibleGroup.objects.filter(
+            pk__in=memberships.values("ansiblegroup_id"),
+        ).values_list("pk", "name", "group_vars")
+    }
+
+    rows = (
+        memberships.order_by("ansiblegroup__name", "host_id")
+        .values_list("ansiblegroup_id", "host_id", "host__name", "host__host_vars")
+        .iterator(chunk_size=chunk_size)
+    )
+    for group_id, members in groupby(rows, key=lambda row: row[0]):
+        # Groups added after the first query are picked up next time
+        if group_id not in group_rows:
+            continue
+        group_name, group_vars = group_rows[group_id]
+        yield group_name, group_vars, (
+            (host_id, host_name, host_vars)
+            for _, host_id, host_name, host_vars in members
+        )
@@ -0,0 +1,194 @@
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+from django.utils import timezone
+from netaddr import IPAddress, IPNetwork
+
+# Largest network whose addresses are all stored as NetworkAddress rows;
+# larger networks use sparse mode, see NetworkLabel.sparse
+DENSE_NETWORK_MAX_SIZE = 2**16
+
+# IPv4 addresses are encoded as IPv4-mapped IPv6 addresses (::ffff:a.b.c.d)
+# so both families share one 128-bit ordering
+IPV4_MAPPED_OFFSET = 0xFFFF << 32
+
+
+def ip_to_int(ip) -> int:
+    """
+    Returns the 128-bit integer of an address, with IPv4 addresses mapped
+    into the IPv6 space.
+    """
+    address = IPAddress(ip)
+    if address.version == 4:
+        return IPV4_MAPPED_OFFSET + int(address)
+    return int(address)
+
+
+def int_to_ip(value: int) -> IPAddress:
+    if IPV4_MAPPED_OFFSET <= value <= IPV4_MAPPED_OFFSET + 0xFFFFFFFF:
+        return IPAddress(value - IPV4_MAPPED_OFFSET, 4)
+    return IPAddress(value, 6)
+
+
+def int_to_key(value: int) -> str:
+    return format(value, "032x")
+
+
+def ip_key(ip) -> str:
+    """
+    Returns the sort key stored in NetworkAddress.ip_key: the address as 32
+    zero padded hex digits. String order matches numeric order on every
+    database, without needing a 128-bit integer column.
+    """
+    return int_to_key(ip_to_int(ip))
+
+
+def network_int_range(network) -> Tuple[int, int]:
+    """
+    Returns the first and last address of a network as integers.
+    """
+    network = IPNetwork(network)
+    first, last = network.first, network.last
+    if network.version == 4:
+        first += IPV4_MAPPED_OFFSET
+        last += IPV4_MAPPED_OFFSET
+    return first, last
+
+
+def network_key_range(network) -> Tuple[str, str]:
+    first, last = network_int_range(network)
+    return int_to_key(first), int_to_key(last)
+
+
+def host_int_range(network) -> Tuple[int, int]:
+    """
+    Returns the first and last usable host address of a network as
+    integers, following ipaddress.ip_network().hosts(): IPv4 networks lose
+    their network and broadcast address, IPv6 networks their subnet-router
+    anycast address.
+    """
+    network = IPNetwork(network)
+    first, last = network_int_range(network)
+    if network.version == 4 and network.size > 2:
+        return first + 1, last - 1
+    if network.version == 6 and network.size > 1:
+        return first + 1, last
+    return first, last
+
+
+def _extend(ranges: List[List[int]], value: int):
+    # Grow the last interval when `value` follows it, else start a new one
+    if ranges and ranges[-1][1] + 1 == value:
+        ranges[-1][1] = value
+    else:
+        ranges.append([value, value])
+
+
+def gaps(used: Iterable[List[int]], first: int, last: int) -> Iterator[List[int]]:
+    """
+    Returns the intervals of [first, last] not covered by the ascending,
+    non-overlapping `used` intervals.
+    """
+    position = first
+    for start, end in used:
+        if end < position:
+            continue
+        if start > last:
+            break
+        if start > position:
+            yield [position, start - 1]
+        position = max(position, end + 1)
+    if position <= last:
+        yield [position, last]
+
+
+def format_ranges(ranges: Iterable[List[int]]) -> List[Dict[str, Any]]:
+    return [
+        {
+            "start": str(int_to_ip(start)),
+            "end": str(int_to_ip(end)),
+            "size": end - start + 1,
+        }
+        for start, end in ranges
+    ]
+
+
+def address_ranges(network_label) -> Dict[str, Any]:
+    """
+    Describes a network as intervals of assigned, reserved and free
+    addresses. Only assigned and reserved rows are read, streamed in address
+    order, so the result scales with fragmentation rather than network size.
+    Expired reservations count as free.
+    """
+    from .models import NetworkAddress
+
+    first, last = host_int_range(network_label.network)
+    assigned, reserved, used = [], [], []
+    for key, is_assigned in (
+        NetworkAddress.objects.filter(network_label_id=network_label.pk)
+        .in_use()
+        .order_by("ip_key")
+        .values_list("ip_key", "is_assigned")
+        .iterator(chunk_size=2000)
+    ):
+        value = int(key, 16)
+        _extend(assigned if is_assigned else reserved, value)
+        _extend(used, value)
+
+    return {
+        "assigned": assigned,
+        "reserved": reserved,
+        "free": list(gaps(used, first, last)),
+    }
+
+
+def iter_free_addresses(network_label) -> Iterator[IPAddress]:
+    """
+    Yields the free addresses of a network in ascending order, computed from
+    the gaps between addresses in use. Works for networks of any size.
+    """
+    for start, end in address_ranges(network_label)["free"]:
+        for value in range(start, end + 1):
+            yield int_to_ip(value)
+
+
+def materialize_free_addresses(network_label, count, contiguous=False):
+    """
+    Makes sure rows exist for the lowest `count` free addresses of a sparse
+    network (or the first run of `count` consecutive ones), so they can be
+    reserved like the rows of a dense network. Returns how many free
+    addresses were found.
+    """
+    from .models import NetworkAddress
+
+    values = []
+    for start, end in address_ranges(network_label)["free"]:
+        if contiguous:
+            if end - start + 1 >= count:
+                values = list(range(start, start + count))
+                break
+            continue
+        values.extend(range(start, min(end, start + count - len(values) - 1) + 1))
+        if len(values) == count:
+            break
+
+    now = timezone.now()
+    addresses = [str(int_to_ip(value)) for value in values]
+    NetworkAddress.objects.bulk_create(
+        [
+            NetworkAddress(
+                ip_address=address,
+                network_label_id=network_label.pk,
+                last_used=now,
+            )
+            for address in addresses
+        ],
+        ignore_conflicts=True,
+    )
+    # Rows left over from earlier calls or released reservations conflict;
+    # mark them used too so the sweeper keeps them while they are offered
+    for start in range(0, len(addresses), 500):
+        NetworkAddress.objects.filter(
+            ip_address__in=addresses[start : start + 500],
+            is_assigned=False,
+        ).update(last_used=now)
+    return len(values)
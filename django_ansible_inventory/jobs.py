@@ -0,0 +1,151 @@
+import io
+import logging
+import os
+import socket
+import threading
+import traceback
+
+from django.conf import settings
+from django.db import (
+    DatabaseError,
+    close_old_connections,
+    connection,
+    transaction,
+)
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+def task(name):
+    """
+    Registers a function as a background task. The function receives the
+    Job being run followed by the job's arguments as keyword arguments.
+    """
+
+    def register(func):
+        TASKS[name] = func
+        return func
+
+    return register
+
+
+def enqueue(task_name, **arguments):
+    """
+    Queues a task for the `run_jobs` worker and returns the Job. With
+    ANSIBLE_INVENTORY_JOBS_SYNC enabled the task runs immediately instead,
+    which is convenient for development.
+    """
+    if task_name not in TASKS:
+        raise ValueError(f"Unknown task {task_name}")
+
+    job = Job.objects.create(task=task_name, arguments=arguments)
+    if getattr(settings, "ANSIBLE_INVENTORY_JOBS_SYNC", False):
+        job.status = Job.RUNNING
+        job.started_at = timezone.now()
+        job.save()
+        run_job(job)
+    return job
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def claim_job(worker=None):
+    """
+    Marks the oldest queued job as running and returns it, or returns None
+    when the queue is empty. Safe to call from concurrent workers.
+    """
+    worker = worker or worker_name()
+    claim = {
+        "status": Job.RUNNING,
+        "worker": worker,
+        "started_at": timezone.now(),
+    }
+    queued = Job.objects.filter(status=Job.QUEUED).order_by("pk")
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job_id = (
+                queued.select_for_update(skip_locked=True)
+                .values_list("pk", flat=True)
+                .first()
+            )
+            if job_id is None:
+                return None
+            Job.objects.filter(pk=job_id).update(**claim)
+        return Job.objects.get(pk=job_id)
+
+    # Without row locks (SQLite) rely on the conditional update: only the
+    # worker that flips the status from queued owns the job
+    for job_id in queued.values_list("pk", flat=True)[:10]:
+        if Job.objects.filter(pk=job_id, status=Job.QUEUED).update(**claim):
+            return Job.objects.get(pk=job_id)
+    return None
+
+
+def set_progress(job, progress, total=None):
+    job.progress = progress
+    job.total = total
+    Job.objects.filter(pk=job.pk).update(progress=progress, total=total)
+
+
+def run_job(job):
+    """
+    Runs a claimed job and records its outcome.
+    """
+    try:
+        message = TASKS[job.task](job, **job.arguments)
+    except Exception:
+        logger.exception("Job %s failed", job)
+        job.status = Job.FAILED
+        job.message = traceback.format_exc()
+    else:
+        job.status = Job.DONE
+        job.message = message or ""
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "message", "finished_at"])
+    return job
+
+
+def work(stop_event, poll_interval=5, once=False):
+    """
+    Worker loop: claims and runs jobs until stop_event is set, or until the
+    queue is empty when once is True.
+    """
+    worker = worker_name()
+    try:
+        while not stop_event.is_set():
+            close_old_connections()
+            try:
+                job = claim_job(worker)
+            except DatabaseError:
+                logger.exception("Could not claim a job, retrying")
+                stop_event.wait(poll_interval)
+                continue
+            if job is None:
+                if once:
+                    break
+                stop_event.wait(poll_interval)
+                continue
+            run_job(job)
+    finally:
+        connection.close()
+
+
+@task("populate_ips")
+def populate_ips(job, network_name):
+    from .management.commands.populate_ips import Command
+
+    output = io.StringIO()
+    command = Command(stdout=output)
+    command.handle(
+        network_name=network_name,
+        progress=lambda progress, total: set_progress(job, progress, total),
+    )
+    return output.getvalue()
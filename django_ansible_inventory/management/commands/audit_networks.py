@@ -0,0 +1,34 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Report Network Labels whose networks overlap or contain each other"
+
+    def handle(self, *args, **kwargs):
+        from ...models import NetworkLabel
+        from ...netindex import NetworkIndex, describe_overlap
+
+        started = time.monotonic()
+        index = NetworkIndex(NetworkLabel.objects.values_list("name", "network"))
+
+        found = 0
+        for (name, network), (other_name, other_network) in index.overlaps():
+            found += 1
+            self.stdout.write(
+                self.style.ERROR(
+                    f"{name} ({network}) {describe_overlap(network, other_network)} "
+                    f"{other_name} ({other_network})"
+                )
+            )
+
+        elapsed = time.monotonic() - started
+        if found:
+            raise CommandError(
+                f"{found} overlapping networks among {len(index)} ({elapsed:.2f}s)"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"No overlapping networks among {len(index)} ({elapsed:.2f}s)"
+            )
+        )
@@ -0,0 +1,62 @@
+import threading
+import time
+from django.core.management.base import BaseCommand
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Release IP reservations that have expired and prune free addresses "
+        "of sparse networks"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Number of reservations released per query",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep running, sweeping every --interval seconds",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=60,
+            help="Seconds between sweeps when running with --loop",
+        )
+
+    def handle(self, *args, **kwargs):
+        from ...sweeper import (
+            expire_reservations,
+            prune_sparse_addresses,
+            sweep_forever,
+        )
+
+        if kwargs["loop"]:
+            self.stdout.write(
+                f"Expiring reservations every {kwargs['interval']} seconds"
+            )
+            try:
+                sweep_forever(
+                    kwargs["interval"],
+                    threading.Event(),
+                    batch_size=kwargs["batch_size"],
+                )
+            except KeyboardInterrupt:
+                pass
+            return
+
+        started = time.monotonic()
+        cleared = expire_reservations(batch_size=kwargs["batch_size"])
+        pruned = prune_sparse_addresses(batch_size=kwargs["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Released {cleared} expired reservations, pruned {pruned} "
+                f"sparse addresses ({time.monotonic() - started:.2f}s)"
+            )
+        )
@@ -0,0 +1,48 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Write the Ansible inventory as an INI, YAML or JSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format",
+            choices=["ini", "yaml", "json"],
+            default="ini",
+            help="Inventory format (default: ini)",
+        )
+        parser.add_argument(
+            "--tag",
+            type=str,
+            help="Only export hosts of groups carrying this tag",
+        )
+        parser.add_argument(
+            "--output",
+            "-o",
+            type=str,
+            help="File to write, standard output by default",
+        )
+
+    def handle(self, *args, **kwargs):
+        from ...renderers import RENDERERS
+
+        started = time.monotonic()
+        chunks = RENDERERS[kwargs["format"]](kwargs["tag"])
+
+        if not kwargs["output"]:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
+            return
+
+        try:
+            with open(kwargs["output"], "w", encoding="utf-8") as file:
+                for chunk in chunks:
+                    file.write(chunk)
+        except OSError as error:
+            raise CommandError(str(error))
+        self.stderr.write(
+            self.style.SUCCESS(
+                f"Wrote {kwargs['output']} ({time.monotonic() - started:.2f}s)"
+            )
+        )
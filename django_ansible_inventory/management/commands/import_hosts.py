@@ -0,0 +1,87 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = "Import hosts from a CSV, YAML or Ansible INI inventory file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", type=str, help="File to import")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "yaml", "ini"],
+            help="File format, guessed from the file extension by default",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Show the changes without writing them",
+        )
+        parser.add_argument(
+            "--update",
+            action="store_true",
+            help="Replace variables and groups of hosts that already exist",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Number of rows written per query",
+        )
+
+    def handle(self, *args, **kwargs):
+        from ...importers import (
+            HostImportError,
+            HostImporter,
+            guess_format,
+            parse_hosts,
+            text_stream,
+        )
+
+        started = time.monotonic()
+        format = kwargs["format"] or guess_format(kwargs["path"])
+        importer = HostImporter(
+            update=kwargs["update"],
+            batch_size=kwargs["batch_size"],
+        )
+        try:
+            with open(kwargs["path"], "rb") as file:
+                records, group_vars = parse_hosts(text_stream(file), format)
+                report = importer.run(
+                    records,
+                    group_vars,
+                    dry_run=kwargs["dry_run"],
+                )
+        except (HostImportError, OSError) as error:
+            raise CommandError(str(error))
+
+        if kwargs["dry_run"] or kwargs["verbosity"] > 1:
+            for change in report["changes"]:
+                if change["action"] == "create":
+                    details = ", ".join(change["groups"])
+                    if change["ip"]:
+                        details = f"{change['ip']} {details}"
+                    self.stdout.write(f"+ {change['name']} {details}".rstrip())
+                else:
+                    for field, values in change["changes"].items():
+                        self.stdout.write(
+                            f"~ {change['name']} {field}: {values['old']} -> "
+                            f"{values['new']}"
+                        )
+
+        for error in report["errors"]:
+            self.stderr.write(self.style.ERROR(error))
+        if report["errors"]:
+            raise CommandError(f"{len(report['errors'])} errors, nothing was imported")
+
+        verb = "Would import" if kwargs["dry_run"] else "Imported"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} {report['created']} new hosts, {report['updated']} "
+                f"updated, {report['unchanged']} unchanged, {report['skipped']} "
+                f"existing skipped, {report['groups_created']} new groups "
+                f"({time.monotonic() - started:.2f}s)"
+            )
+        )
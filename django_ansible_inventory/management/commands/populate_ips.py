@@ -1,6 +1,9 @@
 import ipaddress
+import time
 from django.core.management.base import BaseCommand
 
+DEFAULT_BATCH_SIZE = 5000
+
 
 class Command(BaseCommand):
     help = "Populate IP addresses for a given IP network"
@@ -9,31 +12,78 @@ class Command(BaseCommand):
         parser.add_argument(
             "network_name", type=str, help="The name of the IP network to populate"
         )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Number of addresses inserted per query",
+        )
 
     def handle(self, *args, **kwargs):
         from django.apps import apps
 
+        from django_ansible_inventory.utilization import invalidate_utilization
+
         NetworkLabel = apps.get_model("django_ansible_inventory", "NetworkLabel")
         NetworkAddress = apps.get_model("django_ansible_inventory", "NetworkAddress")
 
         network_name = kwargs["network_name"]
+        batch_size = kwargs.get("batch_size") or DEFAULT_BATCH_SIZE
+        verbosity = kwargs.get("verbosity", 1)
         try:
             network_label = NetworkLabel.objects.get(name=network_name)
+            if network_label.sparse:
+                self.stdout.write(
+                    f"{network_name} is a sparse network, addresses are "
+                    "created as they are allocated"
+                )
+                return
+
             network = ipaddress.ip_network(network_label.network)
+            started = time.monotonic()
 
-            ip_addresses = []
-            for ip in network.hosts():
-                if not NetworkAddress.objects.filter(
-                    ip_address=str(ip), network_label=network_label
-                ).exists():
-                    ip_addresses.append(
-                        NetworkAddress(ip_address=str(ip), network_label=network_label)
-                    )
+            # Fetch the addresses that already exist in one query and diff
+            # against the network in memory
+            existing = set(
+                NetworkAddress.objects.filter(
+                    network_label=network_label,
+                ).values_list("ip_address", flat=True)
+            )
+
+            # hosts() leaves out the network and broadcast addresses; dense
+            # networks are small enough to list up front, which gives the
+            # progress total
+            missing = [ip for ip in map(str, network.hosts()) if ip not in existing]
+
+            # Progress callback used by background jobs, see jobs.py
+            progress = kwargs.get("progress")
+            total = len(missing)
+
+            # Each batch commits on its own so a large network does not hold
+            # the write lock for the whole run; re-running resumes safely
+            created = 0
+            batch = []
+            for ip in missing:
+                batch.append(NetworkAddress(ip_address=ip, network_label=network_label))
+                if len(batch) == batch_size:
+                    created += self.insert_batch(NetworkAddress, network_label, batch)
+                    batch = []
+                    if verbosity > 1:
+                        self.stdout.write(f"  {created} addresses inserted")
+                    if progress:
+                        progress(created, total)
+            if batch:
+                created += self.insert_batch(NetworkAddress, network_label, batch)
+            if progress:
+                progress(created, created)
+            # bulk_create sends no signals
+            invalidate_utilization(network_label.pk)
 
-            NetworkAddress.objects.bulk_create(ip_addresses)
             self.stdout.write(
                 self.style.SUCCESS(
-                    f"Successfully populated IP addresses for {network_name}"
+                    f"Successfully populated IP addresses for {network_name} "
+                    f"({created} added, {len(existing)} existing, "
+                    f"{time.monotonic() - started:.2f}s)"
                 )
             )
 
@@ -43,3 +93,13 @@ class Command(BaseCommand):
                     f"NetworkLabel with name {network_name} does not exist"
                 )
             )
+
+    def insert_batch(self, NetworkAddress, network_label, batch):
+        # ignore_conflicts skips addresses that already exist, e.g. ones
+        # created concurrently or stored under another network label, and
+        # bulk_create() does not say how many rows it skipped, so the rows
+        # of the network are counted around the insert
+        addresses = NetworkAddress.objects.filter(network_label=network_label)
+        before = addresses.count()
+        NetworkAddress.objects.bulk_create(batch, ignore_conflicts=True)
+        return addresses.count() - before
@@ -0,0 +1,54 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the Ansible inventory to a local file, replacing it atomically "
+        "and only when it changed"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            type=str,
+            default=getattr(settings, "ANSIBLE_INVENTORY_PUBLISH_PATH", None),
+            help="File to publish, ANSIBLE_INVENTORY_PUBLISH_PATH by default",
+        )
+        parser.add_argument(
+            "--format",
+            choices=["json", "ini", "yaml"],
+            default=getattr(settings, "ANSIBLE_INVENTORY_PUBLISH_FORMAT", "json"),
+            help="Inventory format, ANSIBLE_INVENTORY_PUBLISH_FORMAT by default",
+        )
+        parser.add_argument(
+            "--tag",
+            type=str,
+            help="Only publish hosts of groups carrying this tag",
+        )
+
+    def handle(self, *args, **kwargs):
+        from ...publisher import publish_inventory
+
+        path = kwargs["path"]
+        if not path:
+            raise CommandError(
+                "Pass --path or set ANSIBLE_INVENTORY_PUBLISH_PATH in settings"
+            )
+
+        started = time.monotonic()
+        try:
+            published = publish_inventory(
+                path,
+                format=kwargs["format"],
+                tag=kwargs["tag"],
+            )
+        except OSError as error:
+            raise CommandError(str(error))
+
+        elapsed = time.monotonic() - started
+        if published:
+            self.stdout.write(self.style.SUCCESS(f"Published {path} ({elapsed:.2f}s)"))
+        else:
+            self.stdout.write(f"{path} is up to date ({elapsed:.2f}s)")
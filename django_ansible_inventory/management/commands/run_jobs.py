@@ -0,0 +1,59 @@
+import threading
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=getattr(settings, "ANSIBLE_INVENTORY_JOB_WORKERS", 1),
+            help="Number of worker threads",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=5,
+            help="Seconds to wait before checking an empty queue again",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is empty instead of waiting for new jobs",
+        )
+
+    def handle(self, *args, **kwargs):
+        from ...jobs import work
+
+        stop_event = threading.Event()
+        threads = [
+            threading.Thread(
+                target=work,
+                kwargs={
+                    "stop_event": stop_event,
+                    "poll_interval": kwargs["poll_interval"],
+                    "once": kwargs["once"],
+                },
+                name=f"run_jobs-{number}",
+                daemon=True,
+            )
+            for number in range(max(kwargs["workers"], 1))
+        ]
+
+        self.stdout.write(f"Starting {len(threads)} job worker(s)")
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(1)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping after the running jobs finish")
+            stop_event.set()
+            for thread in threads:
+                thread.join()
+
+        self.stdout.write(self.style.SUCCESS("Job workers stopped"))
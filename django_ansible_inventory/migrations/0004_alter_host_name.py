@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:28
+
+import django_ansible_inventory.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_ansible_inventory", "0003_networkaddress_is_reserved_and_more"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="host",
+            name="name",
+            field=django_ansible_inventory.fields.LowerCharField(
+                db_index=True, max_length=255
+            ),
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations, models
+from netaddr import IPAddress
+
+
+def ip_key(ip):
+    # Copy of ipam.ip_key() at the time of this migration: the address as
+    # 32 hex digits, IPv4 mapped to ::ffff:a.b.c.d
+    address = IPAddress(ip)
+    value = int(address)
+    if address.version == 4:
+        value += 0xFFFF << 32
+    return format(value, "032x")
+
+
+def populate_ip_key(apps, schema_editor):
+    NetworkAddress = apps.get_model("django_ansible_inventory", "NetworkAddress")
+    batch = []
+    for address in NetworkAddress.objects.only("ip_address").iterator(chunk_size=2000):
+        address.ip_key = ip_key(address.ip_address)
+        batch.append(address)
+        if len(batch) == 2000:
+            NetworkAddress.objects.bulk_update(batch, ["ip_key"])
+            batch = []
+    if batch:
+        NetworkAddress.objects.bulk_update(batch, ["ip_key"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_ansible_inventory", "0005_job"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="networkaddress",
+            name="ip_key",
+            field=models.CharField(
+                db_index=True, default="", editable=False, max_length=32
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(populate_ip_key, migrations.RunPython.noop),
+    ]
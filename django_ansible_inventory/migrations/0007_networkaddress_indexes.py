@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_ansible_inventory", "0006_networkaddress_ip_key"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="networkaddress",
+            index=models.Index(
+                condition=models.Q(("is_assigned", False), ("is_reserved", False)),
+                fields=["network_label", "ip_key"],
+                name="netaddr_free_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="networkaddress",
+            index=models.Index(
+                fields=["network_label", "is_assigned", "is_reserved"],
+                name="netaddr_label_state_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="networkaddress",
+            index=models.Index(
+                condition=models.Q(("is_reserved", True)),
+                fields=["reservation_timestamp"],
+                name="netaddr_reserved_ts_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_ansible_inventory", "0007_networkaddress_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="networkaddress",
+            name="lease_token",
+            field=models.CharField(blank=True, db_index=True, max_length=32, null=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:39
+
+from django.db import migrations, models
+from netaddr import IPNetwork
+
+# ipam.DENSE_NETWORK_MAX_SIZE at the time of this migration
+DENSE_NETWORK_MAX_SIZE = 2**16
+
+
+def mark_large_networks_sparse(apps, schema_editor):
+    NetworkLabel = apps.get_model("django_ansible_inventory", "NetworkLabel")
+    large = [
+        pk
+        for pk, network in NetworkLabel.objects.values_list("pk", "network")
+        if IPNetwork(network).size > DENSE_NETWORK_MAX_SIZE
+    ]
+    NetworkLabel.objects.filter(pk__in=large).update(sparse=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_ansible_inventory", "0008_networkaddress_lease_token"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="networklabel",
+            name="sparse",
+            field=models.BooleanField(
+                default=False,
+                help_text="Only store assigned and reserved addresses. Always on for networks larger than a /16, e.g. IPv6 networks.",
+            ),
+        ),
+        migrations.RunPython(mark_large_networks_sparse, migrations.RunPython.noop),
+    ]
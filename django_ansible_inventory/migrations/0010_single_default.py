@@ -0,0 +1,114 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:45
+
+from django.db import migrations, models
+
+MODELS = [
+    "businessunit",
+    "environment",
+    "hostclass",
+    "hoststatus",
+    "hosttype",
+    "networklabel",
+    "purpose",
+    "supportgroup",
+    "supportlevel",
+]
+
+
+def keep_single_default(apps, schema_editor):
+    # Keep the default with the lowest primary key, preferring enabled items
+    for model_name in MODELS:
+        model = apps.get_model("django_ansible_inventory", model_name)
+        keep = (
+            model.objects.filter(item_default=True)
+            .order_by("-enabled", "pk")
+            .values_list("pk", flat=True)
+            .first()
+        )
+        if keep is not None:
+            model.objects.filter(item_default=True).exclude(pk=keep).update(
+                item_default=False
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_ansible_inventory", "0009_networklabel_sparse"),
+    ]
+
+    operations = [
+        migrations.RunPython(keep_single_default, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="businessunit",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("item_default", True)),
+                fields=("item_default",),
+                name="django_ansible_inventory_businessunit_single_default",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="environment",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("item_default", True)),
+                fields=("item_default",),
+                name="django_ansible_inventory_environment_single_default",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="hostclass",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("item_default", True)),
+                fields=("item_default",),
+                name="django_ansible_inventory_hostclass_single_default",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="hoststatus",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("item_default", True)),
+                fields=("item_default",),
+                name="django_ansible_inventory_hoststatus_single_default",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="hosttype",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("item_default", True)),
+                fields=("item_default",),
+                name="django_ansible_inventory_hosttype_single_default",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="networklabel",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("item_default", True)),
+                fields=("item_default",),
+                name="django_ansible_inventory_networklabel_single_default",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="purpose",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("item_default", True)),
+                fields=("item_default",),
+                name="django_ansible_inventory_purpose_single_default",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="supportgroup",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("item_default", True)),
+                fields=("item_default",),
+                name="django_ansible_inventory_supportgroup_single_default",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="supportlevel",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("item_default", True)),
+                fields=("item_default",),
+                name="django_ansible_inventory_supportlevel_single_default",
+            ),
+        ),
+    ]
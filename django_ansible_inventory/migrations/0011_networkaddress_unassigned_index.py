@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_ansible_inventory", "0010_single_default"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="networkaddress",
+            name="netaddr_free_idx",
+        ),
+        migrations.AddIndex(
+            model_name="networkaddress",
+            index=models.Index(
+                condition=models.Q(("is_assigned", False)),
+                fields=["network_label", "ip_key"],
+                name="netaddr_unassigned_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_ansible_inventory", "0011_networkaddress_unassigned_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="networkaddress",
+            name="last_used",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
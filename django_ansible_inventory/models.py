@@ -1,63 +1,44 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
 from django.utils import timezone
 from datetime import timedelta
+from itertools import islice
 
 from .fields import LowerCharField, UpperCharField, CommonFields
-from netaddr import IPNetwork
+from .ipam import (
+    DENSE_NETWORK_MAX_SIZE,
+    ip_key,
+    iter_free_addresses,
+    network_key_range,
+)
+from netaddr import AddrFormatError, IPNetwork
 
 
 User = get_user_model()
 
+# How long an IP reservation made in the admin is held
+RESERVATION_TIMEOUT = timedelta(minutes=10)
+
 
 def get_default_hosttype():
-    try:
-        item_default = HostType.objects.get(
-            item_default=True,
-        )
-    except HostType.DoesNotExist:
-        return None
-    return item_default.pk
+    return HostType.get_default_pk()
 
 
 def get_default_environment():
-    try:
-        item_default = Environment.objects.get(
-            item_default=True,
-        )
-    except Environment.DoesNotExist:
-        return None
-    return item_default.pk
+    return Environment.get_default_pk()
 
 
 def get_default_purpose():
-    try:
-        item_default = Purpose.objects.get(
-            item_default=True,
-        )
-    except Purpose.DoesNotExist:
-        return None
-    return item_default.pk
+    return Purpose.get_default_pk()
 
 
 def get_default_hoststatus():
-    try:
-        item_default = HostStatus.objects.get(
-            item_default=True,
-        )
-    except HostStatus.DoesNotExist:
-        return None
-    return item_default.pk
+    return HostStatus.get_default_pk()
 
 
 def get_default_hostclass():
-    try:
-        item_default = HostClass.objects.get(
-            item_default=True,
-        )
-    except HostClass.DoesNotExist:
-        return None
-    return item_default.pk
+    return HostClass.get_default_pk()
 
 
 class AnsibleGroupTag(models.Model):
@@ -108,33 +89,71 @@ class NetworkLabel(CommonFields):
         unique=True,
         help_text="IP network in CIDR notation, e.g., 172.16.0.0/23",
     )
+    sparse = models.BooleanField(
+        default=False,
+        help_text=(
+            "Only store assigned and reserved addresses. Always on for "
+            "networks larger than a /16, e.g. IPv6 networks."
+        ),
+    )
 
-    class Meta:
+    class Meta(CommonFields.Meta):
         verbose_name = "Network Label"
         verbose_name_plural = "Network Labels"
 
     def __str__(self):
         return self.name
 
-    def get_available_ips(self):
+    def clean(self):
+        super().clean()
+        from .netindex import describe_overlap, get_network_index
+
+        try:
+            IPNetwork(self.network)
+        except (AddrFormatError, ValueError):
+            raise ValidationError(
+                {"network": f"{self.network} is not a valid network in CIDR notation."}
+            )
+
+        # A lookup in the sorted interval index of every network, kept per
+        # process, instead of comparing each pair
+        conflicts = [
+            (name, network)
+            for (pk, name), network in get_network_index().overlapping(self.network)
+            if pk != self.pk
+        ]
+        if conflicts:
+            raise ValidationError(
+                {
+                    "network": [
+                        f"{self.network} {describe_overlap(self.network, network)} "
+                        f"{network} ({name})."
+                        for name, network in conflicts
+                    ]
+                }
+            )
+
+    def get_available_ips(self, limit=None):
         """
         Returns a list of available IP addresses within the network that are
-        not assigned.
+        not assigned, at most `limit` of them. Sparse networks require a
+        limit since they can hold far too many addresses to list, e.g. 2**64
+        for an IPv6 /64; see ipam.address_ranges() for all of them.
         """
-        all_ips = IPNetwork(self.network)  # Get all IPs in the network
-        assigned_ips = NetworkAddress.objects.filter(
-            network_label=self, is_assigned=True
-        ).values_list("ip_address", flat=True)
-
-        # Filter out .0 and .255 addresses (commonly reserved) and return only
-        # unassigned IPs
-        available_ips = [
-            str(ip)
-            for ip in all_ips
-            if str(ip) not in assigned_ips and ip.words[-1] not in [0, 255]
-        ]
+        if self.sparse:
+            if limit is None:
+                raise ValueError(
+                    f"A limit is required to list available IPs of {self}, "
+                    "it is a sparse network."
+                )
+            # Computed from the gaps between stored addresses
+            return [str(ip) for ip in islice(iter_free_addresses(self), limit)]
+
+        from .bitmap import get_bitmap
 
-        return available_ips
+        # .0 and .255 addresses (commonly reserved) are never free in the
+        # bitmap
+        return [str(ip) for ip in islice(get_bitmap(self).iter_free(), limit)]
 
     def save(
         self,
@@ -143,16 +162,9 @@ class NetworkLabel(CommonFields):
         *args,
         **kwargs,
     ):
-        obj = self.__class__.objects.filter(enabled=True)
-        obj_count = obj.count()
-
-        if obj_count == 0:
-            self.item_default = True
-            self.enabled = True
-        elif self.item_default is True:
-            for item in obj:
-                item.item_default = False
-                item.save()
+        # Networks too large to store every address are always sparse
+        if IPNetwork(self.network).size > DENSE_NETWORK_MAX_SIZE:
+            self.sparse = True
 
         super(NetworkLabel, self).save(
             force_insert=force_insert,
@@ -162,8 +174,70 @@ class NetworkLabel(CommonFields):
         )
 
 
+class NetworkAddressQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.ip_key = ip_key(obj.ip_address)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def free(self, user=None):
+        """
+        Unassigned addresses that are not reserved, or whose reservation
+        has expired. Reservations held by `user` count as free for them.
+        """
+        available = models.Q(is_reserved=False) | models.Q(
+            reservation_timestamp__lt=timezone.now() - RESERVATION_TIMEOUT
+        )
+        if user is not None:
+            available |= models.Q(reserved_by=user)
+        return self.filter(available, is_assigned=False)
+
+    def in_use(self):
+        """
+        Assigned addresses and addresses under an unexpired reservation, the
+        complement of free().
+        """
+        return self.filter(
+            models.Q(is_assigned=True)
+            | models.Q(is_reserved=True)
+            & ~models.Q(reservation_timestamp__lt=timezone.now() - RESERVATION_TIMEOUT)
+        )
+
+    def expired_reservations(self):
+        return self.filter(
+            is_reserved=True,
+            reservation_timestamp__lt=timezone.now() - RESERVATION_TIMEOUT,
+        )
+
+    def unused(self):
+        """
+        Free addresses no host refers to that were not offered, reserved or
+        released within RESERVATION_TIMEOUT.
+        """
+        return self.filter(
+            models.Q(last_used__isnull=True)
+            | models.Q(last_used__lt=timezone.now() - RESERVATION_TIMEOUT),
+            host__isnull=True,
+            is_assigned=False,
+            is_reserved=False,
+        )
+
+    def in_network(self, network):
+        """
+        Filters addresses inside a CIDR network with an index range scan.
+        """
+        return self.filter(ip_key__range=network_key_range(network))
+
+
 class NetworkAddress(models.Model):
     ip_address = models.GenericIPAddressField(unique=True)
+    # Sortable encoding of ip_address, see ipam.ip_key()
+    ip_key = models.CharField(
+        max_length=32,
+        editable=False,
+        db_index=True,
+    )
     network_label = models.ForeignKey(
         NetworkLabel,
         on_delete=models.CASCADE,
@@ -180,310 +254,154 @@ class NetworkAddress(models.Model):
         null=True,
         blank=True,
     )
+    # Shared by addresses reserved together through the allocation API
+    lease_token = models.CharField(
+        max_length=32,
+        null=True,
+        blank=True,
+        db_index=True,
+    )
+    # When the address was last offered, reserved or released; free rows of
+    # sparse networks are pruned once unused for RESERVATION_TIMEOUT
+    last_used = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+    )
+
+    objects = NetworkAddressQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Network Address"
         verbose_name_plural = "Network Addresses"
+        indexes = [
+            # Next free addresses of a network, in address order. Reserved
+            # rows stay in the index because an expired reservation counts
+            # as free (see NetworkAddressQuerySet.free())
+            models.Index(
+                fields=["network_label", "ip_key"],
+                condition=models.Q(is_assigned=False),
+                name="netaddr_unassigned_idx",
+            ),
+            # Unassigned addresses of a network, reserved or not
+            models.Index(
+                fields=["network_label", "is_assigned", "is_reserved"],
+                name="netaddr_label_state_idx",
+            ),
+            # Reservations ordered by age, for expiring them
+            models.Index(
+                fields=["reservation_timestamp"],
+                condition=models.Q(is_reserved=True),
+                name="netaddr_reserved_ts_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.ip_address
 
+    def save(self, *args, **kwargs):
+        self.ip_key = ip_key(self.ip_address)
+        super().save(*args, **kwargs)
+
     def is_reservation_expired(self):
         if self.reservation_timestamp:
-            return timezone.now() > self.reservation_timestamp + timedelta(minutes=10)
+            return timezone.now() > self.reservation_timestamp + RESERVATION_TIMEOUT
         return False
 
 
 class HostType(CommonFields):
     host_type = models.CharField(max_length=100)
 
-    class Meta:
+    class Meta(CommonFields.Meta):
         verbose_name = "Host Type"
         verbose_name_plural = "Host Types"
 
     def __str__(self):
         return self.host_type
 
-    def save(
-        self,
-        force_insert=False,
-        force_update=False,
-        *args,
-        **kwargs,
-    ):
-        obj = self.__class__.objects.filter(enabled=True)
-        obj_count = obj.count()
-
-        if obj_count == 0:
-            self.item_default = True
-            self.enabled = True
-        elif self.item_default is True:
-            for item in obj:
-                item.item_default = False
-                item.save()
-
-        super(HostType, self).save(
-            force_insert=force_insert,
-            force_update=force_update,
-            *args,
-            **kwargs,
-        )
-
 
 class Environment(CommonFields):
     environment = models.CharField(max_length=100)
 
-    class Meta:
+    class Meta(CommonFields.Meta):
         verbose_name = "Environment"
         verbose_name_plural = "Environments"
 
     def __str__(self):
         return self.environment
 
-    def save(
-        self,
-        force_insert=False,
-        force_update=False,
-        *args,
-        **kwargs,
-    ):
-        obj = self.__class__.objects.filter(enabled=True)
-        obj_count = obj.count()
-
-        if obj_count == 0:
-            self.item_default = True
-            self.enabled = True
-        elif self.item_default is True:
-            for item in obj:
-                item.item_default = False
-                item.save()
-
-        super(Environment, self).save(
-            force_insert=force_insert,
-            force_update=force_update,
-            *args,
-            **kwargs,
-        )
-
 
 class Purpose(CommonFields):
     purpose = models.CharField(max_length=100)
 
-    class Meta:
+    class Meta(CommonFields.Meta):
         verbose_name = "Purpose"
         verbose_name_plural = "Purpose"
 
     def __str__(self):
         return self.purpose
 
-    def save(
-        self,
-        force_insert=False,
-        force_update=False,
-        *args,
-        **kwargs,
-    ):
-        obj = self.__class__.objects.filter(enabled=True)
-        obj_count = obj.count()
-
-        if obj_count == 0:
-            self.item_default = True
-            self.enabled = True
-        elif self.item_default is True:
-            for item in obj:
-                item.item_default = False
-                item.save()
-
-        super(Purpose, self).save(
-            force_insert=force_insert,
-            force_update=force_update,
-            *args,
-            **kwargs,
-        )
-
 
 class HostStatus(CommonFields):
     host_status = models.CharField(max_length=100)
 
-    class Meta:
+    class Meta(CommonFields.Meta):
         verbose_name = "Host Status"
         verbose_name_plural = "Host Status"
 
     def __str__(self):
         return self.host_status
 
-    def save(
-        self,
-        force_insert=False,
-        force_update=False,
-        *args,
-        **kwargs,
-    ):
-        obj = self.__class__.objects.filter(enabled=True)
-        obj_count = obj.count()
-
-        if obj_count == 0:
-            self.item_default = True
-            self.enabled = True
-        elif self.item_default is True:
-            for item in obj:
-                item.item_default = False
-                item.save()
-
-        super(HostStatus, self).save(
-            force_insert=force_insert,
-            force_update=force_update,
-            *args,
-            **kwargs,
-        )
-
 
 class HostClass(CommonFields):
     host_class = models.CharField(max_length=100)
 
-    class Meta:
+    class Meta(CommonFields.Meta):
         verbose_name = "Host Class"
         verbose_name_plural = "Host Classes"
 
     def __str__(self):
         return self.host_class
 
-    def save(
-        self,
-        force_insert=False,
-        force_update=False,
-        *args,
-        **kwargs,
-    ):
-        obj = self.__class__.objects.filter(enabled=True)
-        obj_count = obj.count()
-
-        if obj_count == 0:
-            self.item_default = True
-            self.enabled = True
-        elif self.item_default is True:
-            for item in obj:
-                item.item_default = False
-                item.save()
-
-        super(HostClass, self).save(
-            force_insert=force_insert,
-            force_update=force_update,
-            *args,
-            **kwargs,
-        )
-
 
 class BusinessUnit(CommonFields):
     business_unit = models.CharField(max_length=100)
 
-    class Meta:
+    class Meta(CommonFields.Meta):
         verbose_name = "Business Unit"
         verbose_name_plural = "Business Units"
 
     def __str__(self):
         return self.business_unit
 
-    def save(
-        self,
-        force_insert=False,
-        force_update=False,
-        *args,
-        **kwargs,
-    ):
-        obj = self.__class__.objects.filter(enabled=True)
-        obj_count = obj.count()
-
-        if obj_count == 0:
-            self.item_default = True
-            self.enabled = True
-        elif self.item_default is True:
-            for item in obj:
-                item.item_default = False
-                item.save()
-
-        super(BusinessUnit, self).save(
-            force_insert=force_insert,
-            force_update=force_update,
-            *args,
-            **kwargs,
-        )
-
 
 class SupportGroup(CommonFields):
     group = models.CharField(max_length=100)
 
-    class Meta:
+    class Meta(CommonFields.Meta):
         verbose_name = "Support Group"
         verbose_name_plural = "Support Groups"
 
     def __str__(self):
         return self.group
 
-    def save(
-        self,
-        force_insert=False,
-        force_update=False,
-        *args,
-        **kwargs,
-    ):
-        obj = self.__class__.objects.filter(enabled=True)
-        obj_count = obj.count()
-
-        if obj_count == 0:
-            self.item_default = True
-            self.enabled = True
-        elif self.item_default is True:
-            for item in obj:
-                item.item_default = False
-                item.save()
-
-        super(SupportGroup, self).save(
-            force_insert=force_insert,
-            force_update=force_update,
-            *args,
-            **kwargs,
-        )
-
 
 class SupportLevel(CommonFields):
     level = models.CharField(max_length=100)
 
-    class Meta:
+    class Meta(CommonFields.Meta):
         verbose_name = "Support Levels"
         verbose_name_plural = "Support Levels"
 
     def __str__(self):
         return self.level
 
-    def save(
-        self,
-        force_insert=False,
-        force_update=False,
-        *args,
-        **kwargs,
-    ):
-        obj = self.__class__.objects.filter(enabled=True)
-        obj_count = obj.count()
-
-        if obj_count == 0:
-            self.item_default = True
-            self.enabled = True
-        elif self.item_default is True:
-            for item in obj:
-                item.item_default = False
-                item.save()
-
-        super(SupportLevel, self).save(
-            force_insert=force_insert,
-            force_update=force_update,
-            *args,
-            **kwargs,
-        )
-
 
 class Host(models.Model):
-    name = LowerCharField(max_length=255)
+    name = LowerCharField(
+        max_length=255,
+        db_index=True,
+    )
     groups = models.ManyToManyField(
         AnsibleGroup,
         related_name="hosts",
@@ -574,3 +492,60 @@ class Host(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class Job(models.Model):
+    """
+    A unit of background work, queued by the app and executed by the
+    `run_jobs` management command. See jobs.py for the available tasks.
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    task = models.CharField(max_length=100)
+    arguments = models.JSONField(
+        default=dict,
+        blank=True,
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=QUEUED,
+        db_index=True,
+    )
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+    )
+    message = models.TextField(blank=True)
+    worker = models.CharField(
+        max_length=100,
+        blank=True,
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+    )
+
+    class Meta:
+        verbose_name = "Job"
+        verbose_name_plural = "Jobs"
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk}"
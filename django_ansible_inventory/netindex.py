@@ -0,0 +1,271 @@
+import heapq
+import threading
+from bisect import bisect_right
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+
+from django.db import transaction
+from netaddr import IPNetwork
+
+from .ipam import ip_to_int, network_int_range
+from .snapshots import CACHE_PREFIX, get_cache, get_token
+
+TRIE_REVISION_KEY = f"{CACHE_PREFIX}:prefix_trie"
+INDEX_REVISION_KEY = f"{CACHE_PREFIX}:network_index"
+
+
+class NetworkIndex:
+    """
+    Interval index over the integer ranges of networks, ordered by first
+    address. A max segment tree over the last addresses finds the networks
+    overlapping a range in O(log n) per result, and overlaps() sweeps the
+    sorted starts once with a heap of the networks still open.
+
+    `networks` is an iterable of (key, network) pairs, e.g. NetworkLabel
+    primary keys and their CIDR.
+    """
+
+    def __init__(self, networks: Iterable[Tuple[Any, str]]):
+        entries = sorted(
+            (network_int_range(network) + (key, network) for key, network in networks),
+            key=lambda entry: (entry[0], -entry[1]),
+        )
+        self.firsts = [entry[0] for entry in entries]
+        self.lasts = [entry[1] for entry in entries]
+        self.keys = [entry[2] for entry in entries]
+        self.networks = [entry[3] for entry in entries]
+
+        # Leaves hold the last address of each interval, inner nodes the
+        # highest last address below them
+        self._leaves = 1
+        while self._leaves < len(entries):
+            self._leaves *= 2
+        self._max_lasts = [-1] * (2 * self._leaves)
+        self._max_lasts[self._leaves : self._leaves + len(entries)] = self.lasts
+        for node in range(self._leaves - 1, 0, -1):
+            self._max_lasts[node] = max(
+                self._max_lasts[2 * node], self._max_lasts[2 * node + 1]
+            )
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _reaching(self, end: int, first: int) -> Iterator[int]:
+        # Indexes below `end` whose interval reaches `first`, in ascending
+        # order, skipping subtrees whose highest last address is too low
+        stack = [(1, 0, self._leaves)]
+        while stack:
+            node, low, high = stack.pop()
+            if low >= end or self._max_lasts[node] < first:
+                continue
+            if high - low == 1:
+                yield low
+                continue
+            middle = (low + high) // 2
+            stack.append((2 * node + 1, middle, high))
+            stack.append((2 * node, low, middle))
+
+    def overlapping(self, network, exclude=None) -> List[Tuple[Any, str]]:
+        """
+        Returns the (key, network) pairs of indexed networks that overlap
+        `network`, including networks it contains or is contained in.
+        """
+        first, last = network_int_range(network)
+        end = bisect_right(self.firsts, last)
+        return [
+            (self.keys[index], self.networks[index])
+            for index in self._reaching(end, first)
+            if self.keys[index] != exclude
+        ]
+
+    def overlaps(self) -> Iterator[Tuple[Tuple[Any, str], Tuple[Any, str]]]:
+        """
+        Yields every pair of overlapping indexed networks, the one starting
+        first (the larger one when they start together) first.
+        """
+        # Heap of (last, index) of the intervals started so far that may
+        # still reach the next start
+        active: List[Tuple[int, int]] = []
+        for index, first in enumerate(self.firsts):
+            while active and active[0][0] < first:
+                heapq.heappop(active)
+            for _, other in sorted(active, key=lambda entry: entry[1]):
+                yield (
+                    (self.keys[other], self.networks[other]),
+                    (self.keys[index], self.networks[index]),
+                )
+            heapq.heappush(active, (self.lasts[index], index))
+
+
+# Kept per process and validated against a token in the shared cache, like
+# the prefix trie below
+_index: Optional[Tuple[int, NetworkIndex]] = None
+_index_lock = threading.Lock()
+
+
+def get_network_index() -> NetworkIndex:
+    """
+    Returns a NetworkIndex of every NetworkLabel keyed by (pk, name),
+    building it with one query when this process has no current copy.
+    """
+    global _index
+    from .models import NetworkLabel
+
+    revision = get_token(INDEX_REVISION_KEY)
+
+    with _index_lock:
+        cached = _index
+    if cached and cached[0] == revision:
+        return cached[1]
+
+    index = NetworkIndex(
+        ((pk, name), network)
+        for pk, name, network in NetworkLabel.objects.values_list(
+            "pk", "name", "network"
+        )
+    )
+    with _index_lock:
+        _index = (revision, index)
+    return index
+
+
+def invalidate_network_index():
+    """
+    Drops the network index in every process once the current transaction
+    commits.
+    """
+    transaction.on_commit(_drop_network_index)
+
+
+def _drop_network_index():
+    global _index
+    get_cache().delete(INDEX_REVISION_KEY)
+    with _index_lock:
+        _index = None
+
+
+def describe_overlap(network, other) -> str:
+    """
+    Describes how two overlapping networks relate, e.g. "contains".
+    """
+    first, last = network_int_range(network)
+    other_first, other_last = network_int_range(other)
+    if first == other_first and last == other_last:
+        return "is the same network as"
+    if first <= other_first and last >= other_last:
+        return "contains"
+    if other_first <= first and other_last >= last:
+        return "is contained in"
+    return "overlaps"
+
+
+class PrefixTrie:
+    """
+    Binary trie over network prefixes in the shared 128-bit address space
+    (see ipam.ip_to_int). lookup() walks at most one node per prefix bit
+    and returns the value of the longest prefix containing the address.
+    """
+
+    BITS = 128
+
+    def __init__(self, networks: Iterable[Tuple[Any, str]] = ()):
+        # Nodes are [zero child, one child, value]
+        self.root = [None, None, None]
+        self.size = 0
+        for value, network in networks:
+            self.insert(network, value)
+
+    def __len__(self):
+        return self.size
+
+    @staticmethod
+    def _prefix(network) -> Tuple[int, int]:
+        network = IPNetwork(network)
+        first, _ = network_int_range(network)
+        prefixlen = network.prefixlen
+        if network.version == 4:
+            prefixlen += PrefixTrie.BITS - 32
+        return first, prefixlen
+
+    def insert(self, network, value):
+        first, prefixlen = self._prefix(network)
+        node = self.root
+        for depth in range(prefixlen):
+            bit = (first >> (self.BITS - 1 - depth)) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, None]
+            node = node[bit]
+        if node[2] is None:
+            self.size += 1
+        node[2] = value
+
+    def lookup(self, ip) -> Optional[Any]:
+        """
+        Returns the value of the most specific network containing `ip`, or
+        None.
+        """
+        address = ip_to_int(ip)
+        node = self.root
+        found = node[2]
+        for depth in range(self.BITS):
+            node = node[(address >> (self.BITS - 1 - depth)) & 1]
+            if node is None:
+                break
+            if node[2] is not None:
+                found = node[2]
+        return found
+
+
+# The trie is kept per process and validated against a token in the shared
+# cache, like the allocation bitmaps
+_trie: Optional[Tuple[str, PrefixTrie]] = None
+_lock = threading.Lock()
+
+
+def get_prefix_trie() -> PrefixTrie:
+    """
+    Returns a PrefixTrie of every NetworkLabel with (pk, name, network)
+    values, building it with one query when this process has no current
+    copy.
+    """
+    global _trie
+    from .models import NetworkLabel
+
+    revision = get_token(TRIE_REVISION_KEY)
+
+    with _lock:
+        cached = _trie
+    if cached and cached[0] == revision:
+        return cached[1]
+
+    trie = PrefixTrie(
+        ((pk, name, network), network)
+        for pk, name, network in NetworkLabel.objects.values_list(
+            "pk", "name", "network"
+        )
+    )
+    with _lock:
+        _trie = (revision, trie)
+    return trie
+
+
+def find_network(ip) -> Optional[Tuple[int, str, str]]:
+    """
+    Returns (pk, name, network) of the NetworkLabel whose network most
+    specifically contains `ip`, or None.
+    """
+    return get_prefix_trie().lookup(ip)
+
+
+def invalidate_prefix_trie():
+    """
+    Drops the prefix trie in every process once the current transaction
+    commits, so no process rebuilds it from uncommitted networks.
+    """
+    transaction.on_commit(_drop_prefix_trie)
+
+
+def _drop_prefix_trie():
+    global _trie
+    get_cache().delete(TRIE_REVISION_KEY)
+    with _lock:
+        _trie = None
@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class HostCursorPagination(CursorPagination):
+    """
+    Keyset pagination over the primary key, so every page costs the same
+    regardless of how deep into the host list the client is.
+    """
+
+    ordering = "pk"
+    page_size = 1000
+    page_size_query_param = "page_size"
+    max_page_size = 10000
@@ -0,0 +1,13 @@
+from rest_framework.permissions import DjangoModelPermissions
+
+
+class ChangeModelPermissions(DjangoModelPermissions):
+    """
+    Requires the change permission of the view's model for POST, for
+    endpoints that update existing rows, e.g. reserving addresses.
+    """
+
+    perms_map = {
+        **DjangoModelPermissions.perms_map,
+        "POST": ["%(app_label)s.change_%(model_name)s"],
+    }
@@ -0,0 +1,107 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connections
+
+from .renderers import RENDERERS
+
+logger = logging.getLogger(__name__)
+
+_timer = None
+_timer_lock = threading.Lock()
+
+
+def render_inventory(
+    format: str = "json", tag: Optional[str] = None
+) -> Iterable[bytes]:
+    """
+    Returns the inventory as chunks of bytes in a format `ansible-playbook
+    -i` reads: a static JSON or YAML tree, or an INI file.
+    """
+    return (chunk.encode("utf-8") for chunk in RENDERERS[format](tag))
+
+
+def file_digest(path) -> Optional[str]:
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(65536), b""):
+                digest.update(block)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+def publish_inventory(path, format: str = "json", tag: Optional[str] = None) -> bool:
+    """
+    Writes the inventory to `path` through a temporary file renamed over
+    it, so readers always see a complete file. The file is only replaced
+    when its content changed, keeping its modification time stable.
+    Returns whether the file was replaced.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".inventory-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            for chunk in render_inventory(format, tag):
+                digest.update(chunk)
+                tmp_file.write(chunk)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+
+        if digest.hexdigest() == file_digest(path):
+            os.unlink(tmp_path)
+            return False
+        # mkstemp() creates the file readable by its owner only
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return True
+
+
+def _publish_configured():
+    global _timer
+    with _timer_lock:
+        _timer = None
+    close_old_connections()
+    try:
+        publish_inventory(
+            settings.ANSIBLE_INVENTORY_PUBLISH_PATH,
+            format=getattr(settings, "ANSIBLE_INVENTORY_PUBLISH_FORMAT", "json"),
+        )
+    except (DatabaseError, OSError):
+        logger.exception("Could not publish the inventory")
+    finally:
+        # The timer thread is not reused, close its connections
+        connections.close_all()
+
+
+def schedule_publish():
+    """
+    Publishes the inventory to ANSIBLE_INVENTORY_PUBLISH_PATH after
+    ANSIBLE_INVENTORY_PUBLISH_DELAY seconds. Changes made meanwhile are
+    picked up by the pending publish, so a burst of changes writes the
+    file once.
+    """
+    global _timer
+    with _timer_lock:
+        if _timer is not None:
+            return
+        _timer = threading.Timer(
+            getattr(settings, "ANSIBLE_INVENTORY_PUBLISH_DELAY", 5),
+            _publish_configured,
+        )
+        # Not a daemon thread, so a pending publish completes before the
+        # process exits instead of leaving a stale file behind
+        _timer.daemon = False
+        _timer.start()
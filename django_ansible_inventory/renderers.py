@@ -0,0 +1,182 @@
+import ast
+import json
+import shlex
+from typing import Any, Iterable, Iterator, Optional
+
+from rest_framework.renderers import BaseRenderer
+
+from .inventory import iter_inventory_groups
+
+# Lines joined into one chunk of a streamed response
+CHUNK_LINES = 1000
+
+
+def _is_literal(value: str) -> bool:
+    try:
+        ast.literal_eval(value)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        return False
+    return True
+
+
+def ini_var(value: Any) -> str:
+    """
+    Formats a variable for a `[group:vars]` line. Ansible evaluates those
+    values as Python literals, so strings that would parse as one are
+    written as a quoted literal.
+    """
+    if isinstance(value, str) and value == value.strip() and "\n" not in value:
+        if not _is_literal(value):
+            return value
+    return repr(value)
+
+
+def ini_host_var(value: Any) -> str:
+    """
+    Formats a variable for a host line, which Ansible splits like a shell
+    command line before evaluating each value as a Python literal.
+    """
+    if not isinstance(value, str) or _is_literal(value):
+        value = repr(value)
+    if '"' not in value and "\\" not in value and value != shlex.quote(value):
+        # Easier to read than shlex.quote() for Python literals
+        return f'"{value}"'
+    return shlex.quote(value)
+
+
+def _chunks(lines: Iterable[str]) -> Iterator[str]:
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == CHUNK_LINES:
+            yield "".join(chunk)
+            chunk = []
+    if chunk:
+        yield "".join(chunk)
+
+
+def _ini_lines(tag: Optional[str]) -> Iterator[str]:
+    # Host variables are written on the first line of a host only; Ansible
+    # applies them wherever the host is listed
+    seen = set()
+    for group_name, group_vars, hosts in iter_inventory_groups(tag):
+        yield f"[{group_name}]\n"
+        for host_id, host_name, host_vars in hosts:
+            if host_id in seen or not host_vars:
+                yield f"{host_name}\n"
+            else:
+                yield " ".join(
+                    [host_name]
+                    + [
+                        f"{key}={ini_host_var(value)}"
+                        for key, value in host_vars.items()
+                    ]
+                ) + "\n"
+            seen.add(host_id)
+        if group_vars:
+            yield f"\n[{group_name}:vars]\n"
+            for key, value in group_vars.items():
+                yield f"{key}={ini_var(value)}\n"
+        yield "\n"
+
+
+def render_ini(tag: Optional[str] = None) -> Iterator[str]:
+    """
+    Streams the inventory as an Ansible INI file, group by group.
+    """
+    return _chunks(_ini_lines(tag))
+
+
+def _yaml_lines(tag: Optional[str]) -> Iterator[str]:
+    # Values are written as JSON, which is valid YAML flow syntax, so no
+    # YAML library is needed
+    seen = set()
+    empty = True
+    for group_name, group_vars, hosts in iter_inventory_groups(tag):
+        if empty:
+            yield "all:\n  children:\n"
+            empty = False
+        yield f"    {json.dumps(group_name)}:\n      hosts:\n"
+        for host_id, host_name, host_vars in hosts:
+            value = json.dumps(host_vars) if host_id not in seen and host_vars else "{}"
+            yield f"        {json.dumps(host_name)}: {value}\n"
+            seen.add(host_id)
+        if group_vars:
+            yield f"      vars: {json.dumps(group_vars)}\n"
+    if empty:
+        yield "all: {}\n"
+
+
+def render_yaml(tag: Optional[str] = None) -> Iterator[str]:
+    """
+    Streams the inventory as an Ansible YAML file, group by group.
+    """
+    return _chunks(_yaml_lines(tag))
+
+
+def _json_lines(tag: Optional[str]) -> Iterator[str]:
+    # The same tree as the YAML file; Ansible's yaml inventory plugin also
+    # reads it from .json files, unlike the /api/inventory/ output
+    seen = set()
+    empty = True
+    for group_name, group_vars, hosts in iter_inventory_groups(tag):
+        yield '{"all": {"children": {\n' if empty else ",\n"
+        empty = False
+        yield f'  {json.dumps(group_name)}: {{"hosts": {{'
+        for index, (host_id, host_name, host_vars) in enumerate(hosts):
+            value = json.dumps(host_vars) if host_id not in seen and host_vars else "{}"
+            yield f'{", " if index else ""}\n    {json.dumps(host_name)}: {value}'
+            seen.add(host_id)
+        yield "}"
+        if group_vars:
+            yield f', "vars": {json.dumps(group_vars)}'
+        yield "}"
+    yield '{"all": {}}\n' if empty else "\n}}}\n"
+
+
+def render_json(tag: Optional[str] = None) -> Iterator[str]:
+    """
+    Streams the inventory as a static Ansible JSON file, group by group.
+    """
+    return _chunks(_json_lines(tag))
+
+
+class InventoryRenderer(BaseRenderer):
+    """
+    Renderer for inventory formats that are streamed by the view with
+    stream() instead of being rendered from response data.
+    """
+
+    charset = "utf-8"
+
+    def stream(self, tag: Optional[str] = None) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Only used for error responses, e.g. {"detail": "..."}
+        if data is None:
+            return b""
+        return json.dumps(data).encode(self.charset)
+
+
+class InventoryINIRenderer(InventoryRenderer):
+    media_type = "text/plain"
+    format = "ini"
+
+    def stream(self, tag=None):
+        return render_ini(tag)
+
+
+class InventoryYAMLRenderer(InventoryRenderer):
+    media_type = "application/yaml"
+    format = "yaml"
+
+    def stream(self, tag=None):
+        return render_yaml(tag)
+
+
+RENDERERS = {
+    "json": render_json,
+    "ini": render_ini,
+    "yaml": render_yaml,
+}
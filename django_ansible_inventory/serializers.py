@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import AnsibleGroup, Host
+from .models import AnsibleGroup, Host, NetworkAddress
 
 
 class AnsibleGroupSerializer(serializers.ModelSerializer):
@@ -14,3 +14,42 @@ class HostSerializer(serializers.ModelSerializer):
     class Meta:
         model = Host
         fields = ["name", "ip_address", "enabled", "groups", "host_vars"]
+
+
+class NetworkAddressSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = NetworkAddress
+        fields = [
+            "id",
+            "ip_address",
+            "network_label",
+            "is_assigned",
+            "is_reserved",
+            "reservation_timestamp",
+        ]
+
+
+class AllocationSerializer(serializers.Serializer):
+    count = serializers.IntegerField(
+        default=1,
+        min_value=1,
+        max_value=4096,
+    )
+    contiguous = serializers.BooleanField(default=False)
+
+
+class ReleaseSerializer(serializers.Serializer):
+    addresses = serializers.ListField(
+        child=serializers.IPAddressField(),
+        allow_empty=False,
+        required=False,
+    )
+    lease = serializers.CharField(
+        max_length=32,
+        required=False,
+    )
+
+    def validate(self, attrs):
+        if not attrs.get("addresses") and not attrs.get("lease"):
+            raise serializers.ValidationError("Provide addresses or a lease.")
+        return attrs
@@ -1,7 +1,27 @@
-from django.db.models.signals import post_delete, post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
-from .models import Host, NetworkLabel
-from .management.commands.populate_ips import Command
+from django.utils import timezone
+from .models import (
+    AnsibleGroup,
+    AnsibleGroupTag,
+    BusinessUnit,
+    Environment,
+    Host,
+    HostClass,
+    HostStatus,
+    HostType,
+    NetworkAddress,
+    NetworkLabel,
+    Purpose,
+    SupportGroup,
+    SupportLevel,
+)
+from .fields import invalidate_defaults
+from .bitmap import invalidate_bitmap, update_bitmap
+from .jobs import enqueue
+from .netindex import invalidate_network_index, invalidate_prefix_trie
+from .snapshots import invalidate_inventory
+from .utilization import invalidate_utilization
 
 
 @receiver(post_delete, sender=Host)
@@ -9,12 +29,65 @@ def mark_ip_available(sender, instance, **kwargs):
     # Mark the associated IP address as available after host deletion
     if instance.ip_address:
         instance.ip_address.is_assigned = False
+        instance.ip_address.last_used = timezone.now()
         instance.ip_address.save()
 
 
 @receiver(post_save, sender=NetworkLabel)
 def auto_populate_ips(sender, instance, created, **kwargs):
     if created:
-        # Automatically run the management command for the new IP Network
-        command = Command()
-        command.handle(network_name=instance.name)
+        # Populate the new IP Network in the background job queue
+        enqueue("populate_ips", network_name=instance.name)
+
+
+@receiver(post_save, sender=Host)
+@receiver(post_delete, sender=Host)
+@receiver(post_save, sender=AnsibleGroup)
+@receiver(post_delete, sender=AnsibleGroup)
+@receiver(post_save, sender=AnsibleGroupTag)
+@receiver(post_delete, sender=AnsibleGroupTag)
+def invalidate_inventory_on_change(sender, instance, **kwargs):
+    # Any change to hosts, groups or tags makes cached snapshots stale
+    invalidate_inventory()
+
+
+@receiver(m2m_changed, sender=Host.groups.through)
+@receiver(m2m_changed, sender=AnsibleGroup.tags.through)
+def invalidate_inventory_on_membership_change(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        invalidate_inventory()
+
+
+@receiver(post_save, sender=NetworkAddress)
+def sync_bitmap_on_save(sender, instance, **kwargs):
+    update_bitmap(instance.network_label_id, instance.ip_address, instance.is_assigned)
+    invalidate_utilization(instance.network_label_id)
+
+
+@receiver(post_delete, sender=NetworkAddress)
+def sync_bitmap_on_delete(sender, instance, **kwargs):
+    update_bitmap(instance.network_label_id, instance.ip_address, False)
+    invalidate_utilization(instance.network_label_id)
+
+
+@receiver(post_save, sender=NetworkLabel)
+@receiver(post_delete, sender=NetworkLabel)
+def invalidate_network_caches(sender, instance, **kwargs):
+    invalidate_bitmap(instance.pk)
+    invalidate_utilization(instance.pk)
+    invalidate_prefix_trie()
+    invalidate_network_index()
+
+
+@receiver([post_save, post_delete], sender=NetworkLabel)
+@receiver([post_save, post_delete], sender=HostType)
+@receiver([post_save, post_delete], sender=Environment)
+@receiver([post_save, post_delete], sender=Purpose)
+@receiver([post_save, post_delete], sender=HostStatus)
+@receiver([post_save, post_delete], sender=HostClass)
+@receiver([post_save, post_delete], sender=BusinessUnit)
+@receiver([post_save, post_delete], sender=SupportGroup)
+@receiver([post_save, post_delete], sender=SupportLevel)
+def invalidate_defaults_on_change(sender, instance, **kwargs):
+    # Drop cached defaults used for new hosts, see CommonFields.get_default_pk()
+    invalidate_defaults()
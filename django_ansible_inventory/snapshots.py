@@ -0,0 +1,126 @@
+import hashlib
+import secrets
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from .inventory import build_inventory
+
+CACHE_PREFIX = "django_ansible_inventory"
+REVISION_KEY = f"{CACHE_PREFIX}:revision"
+
+
+def get_cache():
+    """
+    Returns the cache used for inventory snapshots. Any Django cache backend
+    works; use a shared one (redis, memcached, database) when running more
+    than one process so invalidations are seen by every worker.
+    """
+    return caches[getattr(settings, "ANSIBLE_INVENTORY_CACHE", "default")]
+
+
+def get_token(key: str) -> int:
+    """
+    Returns the integer token stored under `key` in the shared cache,
+    creating it when missing. Data kept in process memory (bitmaps, the
+    prefix trie, lookup defaults) remembers the token it was built under
+    and is current while the token is unchanged; deleting the key or
+    bumping it with incr() invalidates every process's copy.
+    """
+    cache = get_cache()
+    token = cache.get(key)
+    if token is None:
+        # add() so concurrent workers agree on a single token; a random
+        # start keeps a recreated token from matching an older one
+        cache.add(key, secrets.randbits(48), None)
+        token = cache.get(key)
+    return token
+
+
+def _new_revision() -> Tuple[str, Any]:
+    return uuid.uuid4().hex, timezone.now()
+
+
+def get_revision() -> Tuple[str, Any]:
+    """
+    Returns the (token, last_modified) pair identifying the current state of
+    the inventory data.
+    """
+    cache = get_cache()
+    revision = cache.get(REVISION_KEY)
+    if revision is None:
+        # add() so concurrent workers agree on a single revision
+        cache.add(REVISION_KEY, _new_revision(), None)
+        revision = cache.get(REVISION_KEY) or _new_revision()
+    return revision
+
+
+def invalidate_inventory():
+    """
+    Moves the inventory to a new revision once the current transaction
+    commits. Snapshots of older revisions are never read again and expire
+    from the cache on their own.
+    """
+    # Bumped on commit: a snapshot built by another request before then
+    # reads the old rows, and must not be cached under the new revision
+    transaction.on_commit(lambda: get_cache().set(REVISION_KEY, _new_revision(), None))
+
+    if getattr(settings, "ANSIBLE_INVENTORY_PUBLISH_PATH", None):
+        from .publisher import schedule_publish
+
+        # Publish once the change is committed and visible to other threads
+        transaction.on_commit(schedule_publish)
+
+
+def _snapshot_key(revision: str, tag: Optional[str]) -> str:
+    variant = hashlib.md5((tag or "").encode()).hexdigest()
+    return f"{CACHE_PREFIX}:inventory:{revision}:{variant}"
+
+
+def get_inventory_snapshot(tag: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Returns the rendered inventory for the current revision, building and
+    caching it on a miss. The snapshot holds the serialized JSON bytes so it
+    can be served without touching the database or the renderer.
+    """
+    cache = get_cache()
+    revision, last_modified = get_revision()
+    key = _snapshot_key(revision, tag)
+
+    snapshot = cache.get(key)
+    if snapshot is None:
+        content = JSONRenderer().render(build_inventory(tag=tag))
+        snapshot = {
+            "revision": revision,
+            "last_modified": last_modified,
+            "content": content,
+        }
+        cache.set(
+            key,
+            snapshot,
+            getattr(settings, "ANSIBLE_INVENTORY_CACHE_TIMEOUT", 3600),
+        )
+    return snapshot
+
+
+def get_etag(*variant: str) -> str:
+    """
+    Returns a strong ETag for the current revision. The variant identifies
+    the representation (path, query string, accepted type) so different
+    responses built from the same revision get different tags.
+    """
+    revision, _ = get_revision()
+    return hashlib.sha1(":".join((revision,) + variant).encode()).hexdigest()
+
+
+def get_last_modified():
+    """
+    Returns when the inventory data last changed.
+    """
+    _, last_modified = get_revision()
+    return last_modified
@@ -0,0 +1,111 @@
+import logging
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.db.models import F
+
+from .models import NetworkAddress
+from .utilization import invalidate_utilization
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+
+_thread = None
+_thread_lock = threading.Lock()
+
+
+def expire_reservations(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Clears reservations older than RESERVATION_TIMEOUT in batches of
+    primary keys, so no single UPDATE locks a large part of the table.
+    Returns the number of reservations cleared.
+    """
+    cleared = 0
+    while True:
+        batch = list(
+            NetworkAddress.objects.expired_reservations().values_list("pk", flat=True)[
+                :batch_size
+            ]
+        )
+        if not batch:
+            if cleared:
+                invalidate_utilization()
+            return cleared
+        # Re-check the predicate so a reservation renewed meanwhile is kept
+        cleared += (
+            NetworkAddress.objects.filter(pk__in=batch)
+            .expired_reservations()
+            .update(
+                is_reserved=False,
+                reserved_by=None,
+                reservation_timestamp=None,
+                lease_token=None,
+                # Unused since the reservation was made
+                last_used=F("reservation_timestamp"),
+            )
+        )
+
+
+def prune_sparse_addresses(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Deletes free rows of sparse networks unused for RESERVATION_TIMEOUT,
+    left behind by released or expired reservations and by addresses
+    offered but never taken, so storage stays proportional to usage.
+    Returns the number of rows deleted.
+    """
+    unused = NetworkAddress.objects.filter(network_label__sparse=True).unused()
+    pruned = 0
+    while True:
+        batch = list(unused.values_list("pk", flat=True)[:batch_size])
+        if not batch:
+            return pruned
+        # A single DELETE that re-checks the predicate, so a row reserved or
+        # assigned meanwhile is kept. The collector would load the rows and
+        # delete them by pk without the check; the post_delete receivers
+        # have nothing to do for free rows
+        rows = unused.filter(pk__in=batch)
+        pruned += rows._raw_delete(rows.db)
+
+
+def sweep_forever(interval, stop_event, batch_size=DEFAULT_BATCH_SIZE):
+    while not stop_event.is_set():
+        close_old_connections()
+        try:
+            cleared = expire_reservations(batch_size=batch_size)
+            pruned = prune_sparse_addresses(batch_size=batch_size)
+        except DatabaseError:
+            logger.exception("Could not expire IP reservations")
+        else:
+            if cleared:
+                logger.info("Expired %s IP reservations", cleared)
+            if pruned:
+                logger.info("Pruned %s free sparse network addresses", pruned)
+        stop_event.wait(interval)
+
+
+def start_sweeper_thread(interval):
+    """
+    Starts the in-process sweeper, once per process.
+    """
+    global _thread
+    with _thread_lock:
+        if _thread is not None:
+            return _thread
+        _thread = threading.Thread(
+            target=sweep_forever,
+            args=(interval, threading.Event()),
+            name="reservation-sweeper",
+            daemon=True,
+        )
+        _thread.start()
+        return _thread
+
+
+def start_sweeper_on_request(sender, **kwargs):
+    """
+    request_started receiver that starts the sweeper thread, see apps.py.
+    """
+    if _thread is None:
+        start_sweeper_thread(settings.ANSIBLE_INVENTORY_RESERVATION_SWEEP_INTERVAL)
@@ -0,0 +1,255 @@
+import io
+import threading
+from collections import Counter
+from unittest import skipUnless
+
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from .allocation import allocate
+from .importers import HostImporter, parse_csv
+from .inventory import build_inventory
+from .ipam import materialize_free_addresses
+from .management.commands.populate_ips import Command as PopulateIpsCommand
+from .models import (
+    AnsibleGroup,
+    AnsibleGroupTag,
+    Environment,
+    Host,
+    HostClass,
+    HostStatus,
+    HostType,
+    NetworkAddress,
+    NetworkLabel,
+    Purpose,
+    RESERVATION_TIMEOUT,
+)
+from .sweeper import prune_sparse_addresses
+from .views import HostListView
+
+
+class InventoryTestCase(TestCase):
+    def setUp(self):
+        # Defaults are invalidated on commit, which TestCase never reaches
+        with self.captureOnCommitCallbacks(execute=True):
+            HostType.objects.create(host_type="server")
+            Environment.objects.create(environment="production")
+            Purpose.objects.create(purpose="web")
+            HostStatus.objects.create(host_status="active")
+            HostClass.objects.create(host_class="virtual")
+        self.groups = [
+            AnsibleGroup.objects.create(name=f"group{number}", group_vars={"n": number})
+            for number in range(3)
+        ]
+        self.groups[0].tags.add(AnsibleGroupTag.objects.create(name="web"))
+
+    def add_hosts(self, count):
+        start = Host.objects.count()
+        for number in range(start, start + count):
+            host = Host.objects.create(name=f"host{number}", host_vars={"n": number})
+            host.groups.set(self.groups[: number % 3 + 1])
+
+
+class BuildInventoryTests(InventoryTestCase):
+    def test_query_count_does_not_grow_with_hosts(self):
+        # Hosts, host/group memberships and groups
+        for count in (5, 50):
+            self.add_hosts(count)
+            with self.assertNumQueries(3):
+                inventory = build_inventory()
+            self.assertEqual(len(inventory["_meta"]["hostvars"]), Host.objects.count())
+
+
+class HostListViewTests(InventoryTestCase):
+    def test_query_count_does_not_grow_with_hosts(self):
+        # Hosts, then their groups and the groups' tags prefetched
+        view = HostListView.as_view()
+        for count in (5, 50):
+            self.add_hosts(count)
+            with self.assertNumQueries(3):
+                response = view(APIRequestFactory().get("/api/hosts/"))
+            self.assertEqual(len(response.data), Host.objects.count())
+
+
+class HostImporterUpdateTests(InventoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.add_hosts(1)
+
+    def update(self, csv):
+        records, group_vars = parse_csv(io.StringIO(csv))
+        HostImporter(update=True).run(records, group_vars)
+        return Host.objects.get(name="host0")
+
+    def test_columns_missing_from_the_source_are_kept(self):
+        host = self.update("name,short_description\nhost0,updated\n")
+        self.assertEqual(host.short_description, "updated")
+        self.assertEqual(host.host_vars, {"n": 0})
+        self.assertEqual([group.name for group in host.groups.all()], ["group0"])
+
+    def test_ipv6_host_names_are_accepted(self):
+        records, group_vars = parse_csv(io.StringIO("name\n::1\nfe80::\n"))
+        report = HostImporter().run(records, group_vars)
+        self.assertEqual(report["errors"], [])
+        self.assertEqual(Host.objects.filter(name__in=["::1", "fe80::"]).count(), 2)
+
+    def test_provided_columns_are_replaced(self):
+        host = self.update('name,groups,host_vars\nhost0,group2,"{""n"": 5}"\n')
+        self.assertEqual(host.host_vars, {"n": 5})
+        self.assertEqual([group.name for group in host.groups.all()], ["group2"])
+
+
+@skipUnless(connection.vendor in ("sqlite", "postgresql"), "EXPLAIN output differs")
+class NetworkAddressIndexTests(TestCase):
+    def setUp(self):
+        self.network_label = NetworkLabel.objects.create(
+            name="vlan100", network="10.100.0.0/20"
+        )
+        call_command("populate_ips", "vlan100", verbosity=0, stdout=io.StringIO())
+        # Some addresses in use, so the free rows are a subset
+        NetworkAddress.objects.filter(
+            ip_address__in=["10.100.0.1", "10.100.0.2"]
+        ).update(is_assigned=True)
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(f"ANALYZE {NetworkAddress._meta.db_table}")
+
+    def test_free_addresses_use_the_unassigned_index(self):
+        # The query behind the available IPs view and allocate()
+        plan = (
+            NetworkAddress.objects.filter(network_label=self.network_label)
+            .free()
+            .order_by("ip_key")[:5]
+            .explain()
+        )
+        self.assertIn("netaddr_unassigned_idx", plan)
+        # Rows come out of the index in order, without sorting the network
+        self.assertNotIn("TEMP B-TREE", plan)
+        self.assertNotIn("Sort", plan)
+
+
+class PopulateIpsTests(TestCase):
+    def test_progress_counts_host_addresses(self):
+        NetworkLabel.objects.create(name="vlan500", network="10.50.5.0/24")
+        calls = []
+        # Called like the populate_ips job does, see jobs.py
+        PopulateIpsCommand(stdout=io.StringIO()).handle(
+            network_name="vlan500",
+            batch_size=100,
+            progress=lambda done, total: calls.append((done, total)),
+        )
+        # .0 and .255 are left out
+        self.assertEqual(calls, [(100, 254), (200, 254), (254, 254)])
+
+
+class NetworkLabelCleanTests(TestCase):
+    def test_overlaps_are_found_in_the_cached_index(self):
+        # The index is dropped when a network is saved and committed
+        with self.captureOnCommitCallbacks(execute=True):
+            NetworkLabel.objects.create(name="vlan400", network="10.40.0.0/22")
+        network_label = NetworkLabel(name="vlan401", network="10.40.1.0/24")
+        with self.assertRaisesMessage(ValidationError, "is contained in"):
+            network_label.clean()
+        with self.assertNumQueries(0):
+            with self.assertRaises(ValidationError):
+                network_label.clean()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            NetworkLabel.objects.filter(name="vlan400").get().delete()
+        network_label.clean()
+
+
+class PruneSparseAddressesTests(TestCase):
+    def setUp(self):
+        self.network_label = NetworkLabel.objects.create(
+            name="vlan300v6", network="2001:db8:300::/64"
+        )
+        materialize_free_addresses(self.network_label, 4)
+        self.rows = list(
+            NetworkAddress.objects.filter(network_label=self.network_label).order_by(
+                "ip_key"
+            )
+        )
+
+    def test_offered_addresses_are_kept(self):
+        self.assertEqual(len(self.rows), 4)
+        self.assertEqual(prune_sparse_addresses(), 0)
+
+    def test_addresses_unused_for_the_timeout_are_deleted(self):
+        stale = timezone.now() - RESERVATION_TIMEOUT * 2
+        NetworkAddress.objects.filter(pk__in=[row.pk for row in self.rows[:3]]).update(
+            last_used=stale
+        )
+        NetworkAddress.objects.filter(pk=self.rows[2].pk).update(
+            is_reserved=True, reservation_timestamp=timezone.now()
+        )
+        # Batch, a single DELETE, then an empty batch
+        with self.assertNumQueries(3):
+            self.assertEqual(prune_sparse_addresses(), 2)
+        self.assertQuerySetEqual(
+            NetworkAddress.objects.filter(network_label=self.network_label).order_by(
+                "ip_key"
+            ),
+            self.rows[2:],
+        )
+
+
+class AllocateConcurrencyTests(TransactionTestCase):
+    threads = 8
+    allocations = 5
+
+    def setUp(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("Threads need a file or server database")
+        self.network_label = NetworkLabel.objects.create(
+            name="vlan200", network="10.200.0.0/24"
+        )
+        call_command("populate_ips", "vlan200", verbosity=0, stdout=io.StringIO())
+
+    def run_workers(self, network_label, allocations, count):
+        allocated = Counter()
+        errors = []
+        start = threading.Barrier(self.threads)
+
+        def worker():
+            try:
+                start.wait()
+                for _ in range(allocations):
+                    for address in allocate(network_label, count=count):
+                        allocated[address.pk] += 1
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual([pk for pk, times in allocated.items() if times > 1], [])
+        self.assertEqual(len(allocated), self.threads * allocations * count)
+        self.assertEqual(
+            NetworkAddress.objects.filter(
+                network_label=network_label, is_reserved=True
+            ).count(),
+            len(allocated),
+        )
+
+    def test_concurrent_allocations_never_share_an_address(self):
+        self.run_workers(self.network_label, self.allocations, count=3)
+
+    def test_concurrent_sparse_allocations_all_succeed(self):
+        # Only addresses in use have rows, so every caller adds rows for
+        # the same lowest free addresses before claiming
+        network_label = NetworkLabel.objects.create(
+            name="vlan200v6", network="2001:db8::/64"
+        )
+        self.assertTrue(network_label.sparse)
+        self.run_workers(network_label, allocations=2, count=4)
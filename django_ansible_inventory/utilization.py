@@ -0,0 +1,146 @@
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .ipam import host_int_range
+from .snapshots import CACHE_PREFIX, get_cache, get_token
+
+GENERATION_KEY = f"{CACHE_PREFIX}:utilization"
+COUNTERS = ("total", "assigned", "reserved")
+
+
+def _key(generation, network_label_id, counter) -> str:
+    return f"{CACHE_PREFIX}:utilization:{generation}:{network_label_id}:{counter}"
+
+
+def count_addresses() -> Dict[int, Dict[str, int]]:
+    """
+    Counts the total, assigned and reserved addresses of every network with
+    one grouped aggregate query. Sparse networks only store addresses in
+    use, so their total is the size of the network instead.
+    """
+    from .models import NetworkAddress, NetworkLabel, RESERVATION_TIMEOUT
+
+    cutoff = timezone.now() - RESERVATION_TIMEOUT
+    counts = {}
+    for pk, network, sparse in NetworkLabel.objects.values_list(
+        "pk", "network", "sparse"
+    ):
+        first, last = host_int_range(network)
+        counts[pk] = {
+            "total": last - first + 1 if sparse else 0,
+            "assigned": 0,
+            "reserved": 0,
+        }
+
+    rows = (
+        NetworkAddress.objects.values("network_label")
+        .annotate(
+            total=Count("pk"),
+            assigned=Count("pk", filter=Q(is_assigned=True)),
+            reserved=Count(
+                "pk",
+                filter=Q(is_assigned=False, is_reserved=True)
+                & ~Q(reservation_timestamp__lt=cutoff),
+            ),
+        )
+        .order_by()
+    )
+    for row in rows:
+        counters = counts.get(row["network_label"])
+        if counters is None:
+            continue
+        if not counters["total"]:
+            counters["total"] = row["total"]
+        counters["assigned"] = row["assigned"]
+        counters["reserved"] = row["reserved"]
+    return counts
+
+
+def _with_free(counters: Dict[str, int]) -> Dict[str, int]:
+    used = counters["assigned"] + counters["reserved"]
+    total = counters["total"]
+    return {
+        **counters,
+        "free": max(total - used, 0),
+        "used_percent": round(used * 100 / total, 2) if total else 0,
+    }
+
+
+def get_utilization(network_label_ids: Iterable[int]) -> Dict[int, Dict[str, int]]:
+    """
+    Returns the address counters of the given networks from the cache,
+    recounting every network with count_addresses() on a miss.
+    """
+    network_label_ids = list(network_label_ids)
+    cache = get_cache()
+    generation = get_token(GENERATION_KEY)
+    keys = {
+        _key(generation, pk, counter): (pk, counter)
+        for pk in network_label_ids
+        for counter in COUNTERS
+    }
+    found = cache.get_many(keys)
+
+    if len(found) < len(keys):
+        counts = count_addresses()
+        cache.set_many(
+            {
+                _key(generation, pk, counter): counters[counter]
+                for pk, counters in counts.items()
+                for counter in COUNTERS
+            },
+            getattr(settings, "ANSIBLE_INVENTORY_UTILIZATION_TIMEOUT", 300),
+        )
+    else:
+        counts = {pk: {} for pk in network_label_ids}
+        for key, value in found.items():
+            pk, counter = keys[key]
+            counts[pk][counter] = value
+
+    empty = dict.fromkeys(COUNTERS, 0)
+    return {pk: _with_free(counts.get(pk, empty)) for pk in network_label_ids}
+
+
+def adjust_utilization(network_label_id, **deltas: int):
+    """
+    Applies changes made by the allocation functions to the cached counters
+    of a network, e.g. adjust_utilization(pk, assigned=1, reserved=-1).
+    Counters that are not cached are left to the next recount. Applied
+    once the current transaction commits.
+    """
+    transaction.on_commit(lambda: _incr_counters(network_label_id, deltas))
+
+
+def _incr_counters(network_label_id, deltas):
+    cache = get_cache()
+    generation = get_token(GENERATION_KEY)
+    for counter, delta in deltas.items():
+        if not delta:
+            continue
+        try:
+            cache.incr(_key(generation, network_label_id, counter), delta)
+        except ValueError:
+            pass
+
+
+def invalidate_utilization(network_label_id: Optional[int] = None):
+    """
+    Drops the cached counters of one network, or of every network, once
+    the current transaction commits.
+    """
+    transaction.on_commit(lambda: _drop_counters(network_label_id))
+
+
+def _drop_counters(network_label_id):
+    cache = get_cache()
+    if network_label_id is None:
+        cache.delete(GENERATION_KEY)
+        return
+    generation = get_token(GENERATION_KEY)
+    cache.delete_many(
+        [_key(generation, network_label_id, counter) for counter in COUNTERS]
+    )
@@ -1,12 +1,49 @@
+import io
+
 from rest_framework import generics
-from .serializers import HostSerializer
-from rest_framework.response import Response
+from .serializers import (
+    AllocationSerializer,
+    HostSerializer,
+    NetworkAddressSerializer,
+    ReleaseSerializer,
+)
+from rest_framework.permissions import DjangoModelPermissions
 from rest_framework.views import APIView
-from typing import Dict, Any
-from django.http import JsonResponse
-from django.utils import timezone
-from datetime import timedelta
-from .models import NetworkAddress, Host
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.response import Response
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from netaddr import AddrFormatError
+from rest_framework import status
+from django.shortcuts import get_object_or_404
+from django.db.models import Prefetch
+from .models import (
+    RESERVATION_TIMEOUT,
+    AnsibleGroup,
+    AnsibleGroupTag,
+    NetworkAddress,
+    NetworkLabel,
+    Host,
+)
+from .allocation import AllocationError, allocate, release, release_lease
+from .importers import (
+    HostImportError,
+    HostImporter,
+    format_for_content_type,
+    guess_format,
+    parse_hosts,
+    text_stream,
+)
+from .ipam import address_ranges, format_ranges, materialize_free_addresses
+from .netindex import find_network
+from .pagination import HostCursorPagination
+from .permissions import ChangeModelPermissions
+from .renderers import InventoryINIRenderer, InventoryRenderer, InventoryYAMLRenderer
+from .snapshots import get_etag, get_inventory_snapshot, get_last_modified
+from .utilization import get_utilization
 
 
 def get_available_ips(request):
@@ -16,21 +53,16 @@ def get_available_ips(request):
     )  # Pass the selected IP when editing
 
     if vlan_id:
-        # Clean up expired reservations
-        NetworkAddress.objects.filter(
-            is_reserved=True,
-            reservation_timestamp__lt=timezone.now() - timedelta(minutes=10),
-        ).update(
-            is_reserved=False,
-            reserved_by=None,
-            reservation_timestamp=None,
-        )
+        network_label = NetworkLabel.objects.filter(pk=vlan_id).first()
+        if network_label and network_label.sparse:
+            materialize_free_addresses(network_label, 5)
 
-        available_ips = NetworkAddress.objects.filter(
-            network_label_id=vlan_id,
-            is_assigned=False,
-            is_reserved=False,
-        ).order_by("pk")[:5]
+        # Expired reservations count as free; the sweeper clears them
+        available_ips = (
+            NetworkAddress.objects.filter(network_label_id=vlan_id)
+            .free()
+            .order_by("ip_key")[:5]
+        )
         ip_data = [{"id": ip.id, "ip_address": ip.ip_address} for ip in available_ips]
 
         # If the selected IP is assigned, add it manually
@@ -48,42 +80,341 @@ def get_available_ips(request):
     return JsonResponse({"available_ips": []})
 
 
+def revision_etag(request, *args, **kwargs):
+    return get_etag(
+        request.path,
+        request.META.get("QUERY_STRING", ""),
+        request.META.get("HTTP_ACCEPT", ""),
+    )
+
+
+def revision_last_modified(request, *args, **kwargs):
+    return get_last_modified()
+
+
+# Answers If-None-Match / If-Modified-Since with a 304 before the view
+# builds anything
+revision_condition = condition(
+    etag_func=revision_etag,
+    last_modified_func=revision_last_modified,
+)
+
+
+@method_decorator(revision_condition, name="get")
 class HostListView(generics.ListAPIView):
-    queryset = Host.objects.filter(enabled=True)
+    # Groups and their tags are fetched with one query each for the whole
+    # page; ip_address is serialized from the FK column without a fetch
+    queryset = (
+        Host.objects.filter(enabled=True)
+        .only("name", "ip_address", "enabled", "host_vars")
+        .prefetch_related(
+            Prefetch(
+                "groups",
+                queryset=AnsibleGroup.objects.only(
+                    "name", "group_vars"
+                ).prefetch_related(
+                    Prefetch("tags", queryset=AnsibleGroupTag.objects.only("pk")),
+                ),
+            ),
+        )
+    )
     serializer_class = HostSerializer
+    pagination_class = HostCursorPagination
+    stream_chunk_size = 2000
 
+    def paginate_queryset(self, queryset):
+        # Pagination is opt-in so existing clients keep getting a plain list
+        params = self.request.query_params
+        if "cursor" not in params and "page_size" not in params:
+            return None
+        return super().paginate_queryset(queryset)
 
-class AnsibleInventoryView(APIView):
-    def get(self, request, format=None):
-        tag = request.query_params.get("tag", None)
-        if tag:
-            hosts = Host.objects.filter(enabled=True, groups__tags__name=tag).distinct()
-        else:
-            hosts = Host.objects.filter(enabled=True)
+    def list(self, request, *args, **kwargs):
+        stream = request.query_params.get("stream")
+        if stream == "json":
+            return StreamingHttpResponse(
+                self.stream_json(),
+                content_type="application/json",
+            )
+        if stream == "ndjson":
+            return StreamingHttpResponse(
+                self.stream_ndjson(),
+                content_type="application/x-ndjson",
+            )
+        return super().list(request, *args, **kwargs)
 
-        # Define the type of inventory to guide the linter
-        inventory: Dict[str, Dict[str, Any]] = {"_meta": {"hostvars": {}}}
+    def iter_host_data(self):
+        """
+        Yields serialized hosts in primary key order, fetching and
+        prefetching them chunk by chunk to keep memory bounded.
+        """
+        queryset = self.filter_queryset(self.get_queryset()).order_by("pk")
+        chunk = []
+        for host in queryset.iterator(chunk_size=self.stream_chunk_size):
+            chunk.append(host)
+            if len(chunk) == self.stream_chunk_size:
+                yield from self.get_serializer(chunk, many=True).data
+                chunk = []
+        if chunk:
+            yield from self.get_serializer(chunk, many=True).data
 
-        for host in hosts:
-            for group in host.groups.all():
-                group_name = group.name
-                group_vars = group.group_vars
+    def stream_json(self):
+        renderer = JSONRenderer()
+        yield b"["
+        for index, host_data in enumerate(self.iter_host_data()):
+            if index:
+                yield b","
+            yield renderer.render(host_data)
+        yield b"]"
 
-                if group_name not in inventory:
-                    inventory[group_name] = {
-                        "hosts": [],
-                        "vars": group_vars,
-                    }
+    def stream_ndjson(self):
+        renderer = JSONRenderer()
+        for host_data in self.iter_host_data():
+            yield renderer.render(host_data) + b"\n"
 
-                # Ensure Pylance knows this is a list
-                inventory[group_name]["hosts"].append(
+
+class HostImportView(APIView):
+    """
+    Imports hosts from a CSV, YAML or Ansible INI file, sent as the `file`
+    field of a multipart upload or as the raw request body. Query
+    parameters: `import_format` (guessed from the file name of uploads and
+    the content type of raw bodies, e.g. text/csv, by default),
+    `dry_run=1` to only report the changes and `update=1` to replace
+    variables and groups of existing hosts. Requires the add_host
+    permission, and change_host to update.
+    """
+
+    permission_classes = [DjangoModelPermissions]
+    queryset = Host.objects.none()
+
+    def post(self, request, format=None):
+        params = request.query_params
+        update = params.get("update") in ("1", "true")
+        if update and not request.user.has_perm("django_ansible_inventory.change_host"):
+            raise PermissionDenied("Updating hosts needs the change_host permission.")
+        if request.content_type.startswith("multipart/"):
+            if "file" not in request.FILES:
+                raise ValidationError({"file": "Upload the file to import."})
+            file = request.FILES["file"]
+            import_format = params.get("import_format") or guess_format(file.name)
+        else:
+            file = io.BytesIO(request.body)
+            # A raw body has no file name to guess the format from
+            import_format = params.get("import_format") or format_for_content_type(
+                request.content_type
+            )
+            if import_format is None:
+                raise ValidationError(
                     {
-                        "name": host.name,
-                        "vars": host.host_vars,
+                        "import_format": "Pass import_format, or send the body "
+                        "as text/csv or application/yaml."
                     }
                 )
 
-                # Add host variables to _meta
-                inventory["_meta"]["hostvars"][host.name] = host.host_vars
+        importer = HostImporter(update=update)
+        dry_run = params.get("dry_run") in ("1", "true")
+        try:
+            records, group_vars = parse_hosts(
+                text_stream(file),
+                import_format,
+            )
+            report = importer.run(records, group_vars, dry_run=dry_run)
+        except HostImportError as error:
+            raise ValidationError({"detail": str(error)})
+
+        if report["errors"]:
+            return Response(report, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            report,
+            status=status.HTTP_200_OK if dry_run else status.HTTP_201_CREATED,
+        )
+
+
+@method_decorator(revision_condition, name="get")
+class AnsibleInventoryView(APIView):
+    """
+    Returns the inventory as JSON, or streamed as an Ansible INI or YAML
+    file with `?format=ini|yaml`.
+    """
+
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [
+        InventoryINIRenderer,
+        InventoryYAMLRenderer,
+    ]
+
+    def get(self, request, format=None):
+        tag = request.query_params.get("tag", None)
+        renderer = request.accepted_renderer
+        if isinstance(renderer, InventoryRenderer):
+            return StreamingHttpResponse(
+                renderer.stream(tag),
+                content_type=f"{renderer.media_type}; charset={renderer.charset}",
+            )
+        snapshot = get_inventory_snapshot(tag=tag)
+        return HttpResponse(snapshot["content"], content_type="application/json")
+
+
+@method_decorator(revision_condition, name="get")
+class InventoryHostView(APIView):
+    """
+    Returns the variables of a single host, as used by `inventory.py --host`.
+    Pass `?group_vars=1` to merge in the vars of the host's groups, applied
+    in group name order with the host's own vars taking precedence.
+    """
+
+    def get(self, request, name, format=None):
+        host = (
+            Host.objects.filter(enabled=True, name=name)
+            .order_by("pk")
+            .values_list("pk", "host_vars")
+            .first()
+        )
+        if host is None:
+            raise NotFound(f"Host {name} does not exist.")
+        host_id, host_vars = host
+
+        if request.query_params.get("group_vars") in ("1", "true", "yes"):
+            merged_vars = {}
+            for group_vars in (
+                AnsibleGroup.objects.filter(hosts=host_id)
+                .order_by("name")
+                .values_list("group_vars", flat=True)
+            ):
+                merged_vars.update(group_vars)
+            merged_vars.update(host_vars)
+            host_vars = merged_vars
+
+        return Response(host_vars)
+
+
+def request_user(request):
+    return request.user if request.user.is_authenticated else None
+
+
+class NetworkAllocateView(APIView):
+    """
+    Reserves the next free addresses of a network in one transaction. POST
+    `{"count": N, "contiguous": false}`. The response carries a lease token
+    that releases all of them at once; unused reservations expire after
+    RESERVATION_TIMEOUT.
+    """
+
+    permission_classes = [ChangeModelPermissions]
+    queryset = NetworkAddress.objects.none()
+
+    def post(self, request, pk, format=None):
+        network_label = get_object_or_404(NetworkLabel, pk=pk)
+        serializer = AllocationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            addresses = allocate(
+                network_label,
+                count=serializer.validated_data["count"],
+                user=request_user(request),
+                contiguous=serializer.validated_data["contiguous"],
+            )
+        except AllocationError as error:
+            return Response(
+                {"detail": str(error)},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        return Response(
+            {
+                "lease": addresses[0].lease_token,
+                "expires_at": addresses[0].reservation_timestamp + RESERVATION_TIMEOUT,
+                "addresses": NetworkAddressSerializer(addresses, many=True).data,
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class NetworkReleaseView(APIView):
+    """
+    Releases reservations made through NetworkAllocateView. POST
+    `{"lease": "<token>"}` or `{"addresses": ["10.0.0.1", ...]}`.
+    """
+
+    permission_classes = [ChangeModelPermissions]
+    queryset = NetworkAddress.objects.none()
+
+    def post(self, request, pk, format=None):
+        network_label = get_object_or_404(NetworkLabel, pk=pk)
+        serializer = ReleaseSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        released = 0
+        if serializer.validated_data.get("lease"):
+            released += release_lease(serializer.validated_data["lease"])
+        if serializer.validated_data.get("addresses"):
+            address_ids = NetworkAddress.objects.filter(
+                network_label=network_label,
+                ip_address__in=serializer.validated_data["addresses"],
+            ).values_list("pk", flat=True)
+            released += release(list(address_ids), user=request_user(request))
 
-        return Response(inventory)
+        return Response({"released": released})
+
+
+class NetworkRangesView(APIView):
+    """
+    Returns the assigned, reserved and free addresses of a network as
+    start/end intervals.
+    """
+
+    def get(self, request, pk, format=None):
+        network_label = get_object_or_404(NetworkLabel, pk=pk)
+        ranges = address_ranges(network_label)
+        return Response(
+            {
+                "network": network_label.network,
+                **{state: format_ranges(ranges[state]) for state in ranges},
+            }
+        )
+
+
+class NetworkUtilizationView(APIView):
+    """
+    Returns the total, assigned, reserved and free address counts of every
+    network from cached counters, without counting address rows on each
+    request.
+    """
+
+    def get(self, request, format=None):
+        networks = list(
+            NetworkLabel.objects.order_by("name").values("id", "name", "network")
+        )
+        utilization = get_utilization(network["id"] for network in networks)
+        return Response(
+            [{**network, **utilization[network["id"]]} for network in networks]
+        )
+
+
+class NetworkLookupView(APIView):
+    """
+    Returns the network containing each IP, e.g.
+    `?ip=10.0.0.5&ip=10.0.1.7`, resolved with a longest-prefix match in
+    memory so bulk imports do not query every network.
+    """
+
+    def get(self, request, format=None):
+        ips = request.query_params.getlist("ip")
+        if not ips:
+            raise ValidationError({"ip": "Pass at least one ip parameter."})
+
+        results = []
+        for ip in ips:
+            try:
+                found = find_network(ip)
+            except (AddrFormatError, ValueError):
+                raise ValidationError({"ip": f"{ip} is not a valid IP address."})
+            results.append(
+                {
+                    "ip": ip,
+                    "network": (
+                        dict(zip(("id", "name", "network"), found)) if found else None
+                    ),
+                }
+            )
+        return Response(results)